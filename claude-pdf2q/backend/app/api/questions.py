@@ -1,83 +1,167 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import Callable, Dict, List, Optional
 import random
 
-from ..database import get_db
+from ..database import get_async_db
+from ..metrics import TimedRoute
 from ..models import Textbook, Chapter, Question
+from ..sampler import STRATA_DIMENSIONS, question_sampler
+from ..search import highlight_snippet, match_expression, questions_fts, search_match, search_rank, search_snippet
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/chapters/{textbook_id}")
-async def get_chapters(textbook_id: int, db: Session = Depends(get_db)):
+async def get_chapters(textbook_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get all chapters for a specific textbook
     """
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
-    chapters = db.query(Chapter).filter(
-        Chapter.textbook_id == textbook_id
-    ).order_by(Chapter.chapter_number).all()
+    # Count questions per chapter in the same query rather than loading them
+    question_counts = select(
+        Question.chapter_id,
+        func.count(Question.id).label('question_count')
+    ).where(
+        Question.textbook_id == textbook_id
+    ).group_by(Question.chapter_id).subquery()
+    
+    chapters = (await db.execute(
+        select(Chapter, question_counts.c.question_count)
+        .outerjoin(question_counts, question_counts.c.chapter_id == Chapter.id)
+        .where(Chapter.textbook_id == textbook_id)
+        .order_by(Chapter.page_start, Chapter.level, Chapter.id)
+    )).all()
     
     return [{
         "id": chapter.id,
         "title": chapter.title,
         "chapter_number": chapter.chapter_number,
+        "label": chapter.label,
+        "parent_id": chapter.parent_id,
         "level": chapter.level,
         "page_start": chapter.page_start,
         "page_end": chapter.page_end,
-        "question_count": len(chapter.questions) if chapter.questions else 0
-    } for chapter in chapters]
+        "question_count": question_count or 0
+    } for chapter, question_count in chapters]
 
 @router.get("/questions/random")
 async def get_random_question(
     textbook_id: Optional[int] = Query(None),
     chapter_id: Optional[int] = Query(None),
     question_type: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    session: Optional[str] = Query(None, max_length=64),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get a random question based on filters
+    Get a random question based on filters.
+
+    Pass a session id (any string the client keeps for its practice session)
+    to avoid repeats: the session gets every matching question once before
+    any comes up again.
     """
-    query = db.query(Question)
-    
-    if textbook_id:
-        query = query.filter(Question.textbook_id == textbook_id)
+    for _ in range(2):
+        question_id = await question_sampler.sample(
+            db, textbook_id or None, chapter_id or None, question_type or None, session
+        )
+        if question_id is None:
+            raise HTTPException(status_code=404, detail="No questions found with the specified criteria")
+        
+        # Fetch the question with its chapter in one query
+        match = (await db.execute(
+            select(Question, Chapter).outerjoin(
+                Chapter, Chapter.id == Question.chapter_id
+            ).where(Question.id == question_id)
+        )).first()
+        if match is not None:
+            break
+        # Deleted since the ids were cached, e.g. by a re-extraction
+        question_sampler.invalidate(textbook_id or None)
+    else:
+        raise HTTPException(status_code=404, detail="No questions found with the specified criteria")
     
-    if chapter_id:
-        query = query.filter(Question.chapter_id == chapter_id)
+    question, chapter = match
     
-    if question_type:
-        query = query.filter(Question.question_type == question_type)
+    return _question_with_chapter(question, chapter)
+
+@router.get("/questions/quiz")
+async def get_quiz(
+    count: int = Query(10, ge=1, le=100),
+    textbook_id: Optional[int] = Query(None),
+    chapter_id: Optional[int] = Query(None),
+    question_type: Optional[str] = Query(None),
+    stratify: Optional[str] = Query(None),
+    chapter_weights: Optional[str] = Query(None),
+    type_weights: Optional[str] = Query(None),
+    allocation: str = Query("equal", pattern="^(equal|proportional)$"),
+    seed: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get count distinct random questions in one call.
+
+    stratify ("chapter", "question_type" or both, comma-separated) splits
+    the quiz between chapters and/or types: evenly, or by how many questions
+    each has with allocation=proportional. chapter_weights and type_weights
+    ("id:weight,..." and "type:weight,...", weight 0 excludes) tilt the split
+    and imply stratifying by their dimension. The same seed returns the same
+    quiz while the textbook's questions are unchanged.
+    """
+    dimensions = set(filter(None, (stratify or "").split(",")))
+    unknown = dimensions - set(STRATA_DIMENSIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot stratify by {', '.join(sorted(unknown))}")
     
-    # Get total count
-    total_questions = query.count()
+    weights = {}
+    if chapter_weights:
+        weights["chapter"] = _parse_weights(chapter_weights, lambda key: None if key == "none" else int(key))
+    if type_weights:
+        weights["question_type"] = _parse_weights(type_weights, str)
+    dimensions.update(weights)
     
-    if total_questions == 0:
-        raise HTTPException(status_code=404, detail="No questions found with the specified criteria")
+    if seed is None:
+        seed = random.randrange(2 ** 31)
     
-    # Get random question using OFFSET
-    random_offset = random.randint(0, total_questions - 1)
-    question = query.offset(random_offset).first()
+    for _ in range(2):
+        question_ids, strata = await question_sampler.sample_many(
+            db,
+            count,
+            textbook_id or None,
+            chapter_id or None,
+            question_type or None,
+            stratify=tuple(dimension for dimension in STRATA_DIMENSIONS if dimension in dimensions),
+            weights=weights,
+            proportional=allocation == "proportional",
+            seed=seed
+        )
+        if not question_ids:
+            raise HTTPException(status_code=404, detail="No questions found with the specified criteria")
+        
+        # Fetch all questions with their chapters in one query
+        matches = {
+            question.id: (question, chapter)
+            for question, chapter in (await db.execute(
+                select(Question, Chapter).outerjoin(
+                    Chapter, Chapter.id == Question.chapter_id
+                ).where(Question.id.in_(question_ids))
+            )).all()
+        }
+        if len(matches) == len(question_ids):
+            break
+        # Some were deleted since the ids were cached, e.g. by a re-extraction
+        question_sampler.invalidate(textbook_id or None)
     
-    # Get chapter info
-    chapter = db.query(Chapter).filter(Chapter.id == question.chapter_id).first()
+    questions = [_question_with_chapter(*matches[question_id]) for question_id in question_ids if question_id in matches]
     
     return {
-        "id": question.id,
-        "question_text": question.question_text,
-        "question_type": question.question_type,
-        "page_number": question.page_number,
-        "context": question.context,
-        "answer": question.answer,
-        "chapter": {
-            "id": chapter.id if chapter else None,
-            "title": chapter.title if chapter else "Unknown",
-            "chapter_number": chapter.chapter_number if chapter else None
-        }
+        "seed": seed,
+        "requested": count,
+        "count": len(questions),
+        "strata": strata,
+        "questions": questions
     }
 
 @router.get("/questions/by-chapter/{chapter_id}")
@@ -85,26 +169,29 @@ async def get_questions_by_chapter(
     chapter_id: int,
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all questions for a specific chapter with pagination
     """
-    chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
+    chapter = await db.get(Chapter, chapter_id)
     if not chapter:
         raise HTTPException(status_code=404, detail="Chapter not found")
     
-    questions = db.query(Question).filter(
-        Question.chapter_id == chapter_id
-    ).offset(offset).limit(limit).all()
+    questions = (await db.scalars(
+        select(Question).where(Question.chapter_id == chapter_id).offset(offset).limit(limit)
+    )).all()
     
-    total_questions = db.query(Question).filter(Question.chapter_id == chapter_id).count()
+    total_questions = await db.scalar(
+        select(func.count(Question.id)).where(Question.chapter_id == chapter_id)
+    )
     
     return {
         "chapter": {
             "id": chapter.id,
             "title": chapter.title,
-            "chapter_number": chapter.chapter_number
+            "chapter_number": chapter.chapter_number,
+            "label": chapter.label
         },
         "questions": [{
             "id": q.id,
@@ -123,74 +210,116 @@ async def get_questions_by_chapter(
 async def search_questions(
     query: str = Query(..., min_length=3),
     textbook_id: Optional[int] = Query(None),
+    chapter_id: Optional[int] = Query(None),
+    question_type: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Search questions by text content
+    Full-text search over question text and context, best matches first.
+
+    Words must all match; end a word with * to match it as a prefix and put
+    text in double quotes to match it as a phrase. Each result carries a
+    snippet with the matched terms highlighted.
     """
-    search_query = db.query(Question).filter(
-        Question.question_text.contains(query)
+    expression = match_expression(query)
+    if expression is None:
+        raise HTTPException(status_code=400, detail="Search query has no searchable words")
+    
+    # Ranking, snippets, filters and chapters all come from one query
+    score = search_rank().label('score')
+    search_query = select(
+        Question,
+        Chapter,
+        search_snippet().label('snippet'),
+        score
+    ).select_from(questions_fts).join(
+        Question, Question.id == questions_fts.c.rowid
+    ).outerjoin(
+        Chapter, Chapter.id == Question.chapter_id
+    ).where(
+        search_match(expression)
     )
     
     if textbook_id:
-        search_query = search_query.filter(Question.textbook_id == textbook_id)
+        search_query = search_query.where(Question.textbook_id == textbook_id)
+    
+    if chapter_id:
+        search_query = search_query.where(Question.chapter_id == chapter_id)
+    
+    if question_type:
+        search_query = search_query.where(Question.question_type == question_type)
     
-    questions = search_query.limit(limit).all()
+    matches = (await db.execute(
+        search_query.order_by(score, Question.id).offset(offset).limit(limit)
+    )).all()
     
     results = []
-    for question in questions:
-        chapter = db.query(Chapter).filter(Chapter.id == question.chapter_id).first()
-        
+    for question, chapter, snippet, rank in matches:
         results.append({
             "id": question.id,
             "question_text": question.question_text,
             "question_type": question.question_type,
             "page_number": question.page_number,
+            "snippet": highlight_snippet(snippet),
+            "score": round(-rank, 6),
             "chapter": {
                 "id": chapter.id if chapter else None,
                 "title": chapter.title if chapter else "Unknown",
-                "chapter_number": chapter.chapter_number if chapter else None
+                "chapter_number": chapter.chapter_number if chapter else None,
+                "label": chapter.label if chapter else None
             }
         })
     
     return {
         "query": query,
         "results": results,
-        "count": len(results)
+        "count": len(results),
+        "offset": offset,
+        "limit": limit
     }
 
 @router.get("/statistics/{textbook_id}")
-async def get_textbook_statistics(textbook_id: int, db: Session = Depends(get_db)):
+async def get_textbook_statistics(textbook_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get statistics for a textbook
     """
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
     
     # Get question counts by type
-    question_types = db.query(
-        Question.question_type,
-        func.count(Question.id).label('count')
-    ).filter(
-        Question.textbook_id == textbook_id
-    ).group_by(Question.question_type).all()
+    question_types = (await db.execute(
+        select(
+            Question.question_type,
+            func.count(Question.id).label('count')
+        ).where(
+            Question.textbook_id == textbook_id
+        ).group_by(Question.question_type)
+    )).all()
     
     # Get question counts by chapter
-    chapter_stats = db.query(
-        Chapter.id,
-        Chapter.title,
-        Chapter.chapter_number,
-        func.count(Question.id).label('question_count')
-    ).outerjoin(Question).filter(
-        Chapter.textbook_id == textbook_id
-    ).group_by(
-        Chapter.id, Chapter.title, Chapter.chapter_number
-    ).order_by(Chapter.chapter_number).all()
+    chapter_stats = (await db.execute(
+        select(
+            Chapter.id,
+            Chapter.title,
+            Chapter.chapter_number,
+            Chapter.label,
+            func.count(Question.id).label('question_count')
+        ).outerjoin(Question).where(
+            Chapter.textbook_id == textbook_id
+        ).group_by(
+            Chapter.id, Chapter.title, Chapter.chapter_number, Chapter.label
+        ).order_by(Chapter.page_start, Chapter.level, Chapter.id)
+    )).all()
     
-    total_questions = db.query(Question).filter(Question.textbook_id == textbook_id).count()
-    total_chapters = db.query(Chapter).filter(Chapter.textbook_id == textbook_id).count()
+    total_questions = await db.scalar(
+        select(func.count(Question.id)).where(Question.textbook_id == textbook_id)
+    )
+    total_chapters = await db.scalar(
+        select(func.count(Chapter.id)).where(Chapter.textbook_id == textbook_id)
+    )
     
     return {
         "textbook": {
@@ -211,9 +340,43 @@ async def get_textbook_statistics(textbook_id: int, db: Session = Depends(get_db
                     "id": cs.id,
                     "title": cs.title,
                     "chapter_number": cs.chapter_number,
+                    "label": cs.label,
                     "question_count": cs.question_count or 0
                 }
                 for cs in chapter_stats
             ]
         }
-    }
\ No newline at end of file
+    }
+
+def _question_with_chapter(question: Question, chapter: Optional[Chapter]) -> Dict:
+    return {
+        "id": question.id,
+        "question_text": question.question_text,
+        "question_type": question.question_type,
+        "page_number": question.page_number,
+        "context": question.context,
+        "answer": question.answer,
+        "chapter": {
+            "id": chapter.id if chapter else None,
+            "title": chapter.title if chapter else "Unknown",
+            "chapter_number": chapter.chapter_number if chapter else None,
+            "label": chapter.label if chapter else None
+        }
+    }
+
+def _parse_weights(text: str, parse_key: Callable) -> Dict:
+    """
+    Parse "key:weight,key:weight" into a dict; 400 on malformed input
+    """
+    weights = {}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.rpartition(":")
+        try:
+            key = parse_key(key.strip())
+            weight = float(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid weight '{item}', expected key:weight")
+        if not 0 <= weight < float("inf"):
+            raise HTTPException(status_code=400, detail=f"Invalid weight '{item}', weights must be zero or positive")
+        weights[key] = weight
+    return weights
@@ -1,81 +1,86 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 import os
-import shutil
 import asyncio
+import uuid
+import json
+import logging
 from datetime import datetime
+import PyPDF2
 
-from ..database import get_db
-from ..models import Textbook
-from ..pdf_processor import PDFProcessor
+from ..database import AsyncSessionLocal, get_async_db, get_db
+from ..job_queue import active_job, cancel_job, enqueue_job, job_summary, list_jobs
+from ..models import Textbook, Chapter, ProcessingJob
+from ..metrics import TimedRoute
+from ..profiling import profile_path, profile_summary
+from ..progress import TERMINAL_STATUSES, progress_board
+from ..question_extractor import EXTRACTOR_VERSION
+from ..upload_stream import receive_upload
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = "uploads"
+PROGRESS_KEEPALIVE = 15.0  # Seconds between keep-alive comments on an idle progress stream
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/upload")
+# The upload body is parsed by hand, so describe it for the interactive docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+@router.post("/upload", openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_pdf(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
+    request: Request,
+    profile: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Upload a PDF file for processing
+    Upload a PDF file for processing, optionally profiling the processing job.
+    
+    The file is streamed to disk without blocking the event loop; database
+    work and page counting run in the threadpool.
     """
-    # Validate file type
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    upload = await receive_upload(request, UPLOAD_DIR)
     
-    # Generate unique filename
+    # Generate unique filename; the random part keeps concurrent uploads of the
+    # same name within a second apart
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{file.filename}"
+    filename = f"{timestamp}_{uuid.uuid4().hex[:12]}_{os.path.basename(upload['original_name'])}"
     file_path = os.path.join(UPLOAD_DIR, filename)
     
     try:
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Create textbook record
-        textbook = Textbook(
-            filename=filename,
-            original_name=file.filename,
-            title=file.filename.replace('.pdf', ''),
-            file_size=file_size,
-            processing_status="pending"
-        )
-        
-        db.add(textbook)
-        db.commit()
-        db.refresh(textbook)
-        
-        # Start background processing
-        background_tasks.add_task(process_pdf_background, file_path, textbook.id, db)
-        
-        return {
-            "message": "File uploaded successfully",
-            "textbook_id": textbook.id,
-            "filename": filename,
-            "status": "pending"
-        }
+        return await run_in_threadpool(_register_upload, db, upload, filename, file_path, profile)
         
     except Exception as e:
-        # Clean up file if database operation fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Clean up the temporary file if database operation fails; _register_upload
+        # removes the final file itself, as only it knows whether it created it
+        if os.path.exists(upload['temp_path']):
+            os.remove(upload['temp_path'])
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @router.get("/processing-status/{textbook_id}")
-async def get_processing_status(textbook_id: int, db: Session = Depends(get_db)):
+async def get_processing_status(textbook_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get the processing status of a textbook
     """
-    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    textbook = await db.get(Textbook, textbook_id)
     
     if not textbook:
         raise HTTPException(status_code=404, detail="Textbook not found")
@@ -85,15 +90,258 @@ async def get_processing_status(textbook_id: int, db: Session = Depends(get_db))
         "filename": textbook.original_name,
         "status": textbook.processing_status,
         "total_pages": textbook.total_pages,
-        "upload_date": textbook.upload_date
+        "upload_date": textbook.upload_date,
+        "peak_rss_bytes": textbook.peak_rss_bytes,
+        "duplicates_suppressed": textbook.duplicates_suppressed,
+        "processing_seconds": textbook.processing_seconds,
+        "skipped_pages": json.loads(textbook.skipped_pages or "[]"),
+        "skipped_page_seconds": textbook.skipped_page_seconds
+    }
+
+@router.get("/processing-status/{textbook_id}/stream")
+async def stream_processing_status(textbook_id: int, request: Request):
+    """
+    Server-Sent Events stream of a textbook's processing progress: pages
+    processed, questions found, pages/sec and ETA. Updates are pushed as
+    workers report them; the stream ends once processing has finished.
+    """
+    snapshot, version = progress_board.get(textbook_id)
+    
+    if snapshot is None:
+        # Nothing reported since this server started; describe the stored state once.
+        # The session is closed before streaming, so an open stream holds no pooled
+        # connection or read snapshot
+        async with AsyncSessionLocal() as db:
+            textbook = await db.get(Textbook, textbook_id)
+            if not textbook:
+                raise HTTPException(status_code=404, detail="Textbook not found")
+            job = await db.scalar(
+                select(ProcessingJob).where(
+                    ProcessingJob.textbook_id == textbook_id
+                ).order_by(ProcessingJob.id.desc()).limit(1)
+            )
+        snapshot = {
+            "textbook_id": textbook_id,
+            "job_id": job.id if job else None,
+            "status": job.status if job else textbook.processing_status,
+            "total_pages": textbook.total_pages,
+            "pages_processed": job.last_committed_page if job else 0,
+            "questions_found": None,
+            "pages_per_sec": None,
+            "eta_seconds": None
+        }
+    
+    async def events():
+        current, seen = snapshot, version
+        while True:
+            yield f"event: progress\ndata: {json.dumps(current)}\n\n"
+            if current.get("status") in TERMINAL_STATUSES:
+                return
+            
+            latest = seen
+            while latest == seen:
+                if await request.is_disconnected():
+                    return
+                current, latest = await progress_board.wait(textbook_id, seen, PROGRESS_KEEPALIVE)
+                if latest == seen:
+                    yield ": keep-alive\n\n"
+            seen = latest
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/textbooks/{textbook_id}/retry")
+def retry_processing(
+    textbook_id: int,
+    profile: bool = False,
+    retry_skipped: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Resume processing of a failed, cancelled or interrupted textbook from its last checkpoint
+    """
+    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    
+    if not textbook:
+        raise HTTPException(status_code=404, detail="Textbook not found")
+    
+    if textbook.processing_status == "completed":
+        raise HTTPException(status_code=400, detail="Textbook has already been processed")
+    
+    job = active_job(db, textbook_id)
+    if job and job.status == "running":
+        raise HTTPException(status_code=409, detail="Textbook is already being processed")
+    
+    file_path = os.path.join(UPLOAD_DIR, textbook.filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="Uploaded file is no longer available")
+    
+    job = enqueue_job(
+        db, textbook.id, file_path, page_count=textbook.total_pages, profile=profile, retry_skipped=retry_skipped
+    )
+    
+    return {
+        "message": "Processing resumed",
+        "textbook_id": textbook.id,
+        "job_id": job.id,
+        "resume_from_page": (job.last_committed_page or 0) + 1,
+        "status": "pending"
+    }
+
+@router.get("/textbooks/{textbook_id}/profile")
+async def get_processing_profile(
+    textbook_id: int,
+    format: str = "prof",
+    sort: str = "cumulative",
+    limit: int = 50
+):
+    """
+    Download the cProfile stats of the textbook's last profiled processing job,
+    either as a binary pstats file or as a text report
+    """
+    path = profile_path(textbook_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile recorded for this textbook")
+    
+    if format == "text":
+        try:
+            return PlainTextResponse(profile_summary(textbook_id, sort, limit))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    if format != "prof":
+        raise HTTPException(status_code=400, detail="Format must be 'prof' or 'text'")
+    
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"textbook_{textbook_id}.prof"
+    )
+
+@router.post("/textbooks/{textbook_id}/reextract")
+def reextract_textbook(
+    textbook_id: int,
+    force: bool = False,
+    retry_skipped: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Re-run question extraction for a processed textbook with the current extractor rules
+    """
+    textbook = db.query(Textbook).filter(Textbook.id == textbook_id).first()
+    
+    if not textbook:
+        raise HTTPException(status_code=404, detail="Textbook not found")
+    
+    if textbook.processing_status != "completed":
+        raise HTTPException(status_code=400, detail="Textbook has not finished processing")
+    
+    if active_job(db, textbook_id):
+        raise HTTPException(status_code=409, detail="Textbook is already being processed")
+    
+    if textbook.extractor_version == EXTRACTOR_VERSION and not (force or retry_skipped):
+        return {
+            "message": "Questions are already up to date",
+            "textbook_id": textbook.id,
+            "extractor_version": EXTRACTOR_VERSION,
+            "status": "completed"
+        }
+    
+    job = enqueue_job(
+        db, textbook.id, os.path.join(UPLOAD_DIR, textbook.filename),
+        kind="reextract", page_count=textbook.total_pages, retry_skipped=retry_skipped
+    )
+    
+    return {
+        "message": "Re-extraction queued",
+        "textbook_id": textbook.id,
+        "job_id": job.id,
+        "extractor_version": EXTRACTOR_VERSION,
+        "status": "pending"
+    }
+
+@router.post("/reextract")
+def reextract_library(db: Session = Depends(get_db)):
+    """
+    Re-extract every processed textbook whose questions predate the current extractor rules
+    """
+    textbooks = db.query(Textbook).filter(
+        Textbook.processing_status == "completed",
+        or_(Textbook.extractor_version.is_(None), Textbook.extractor_version < EXTRACTOR_VERSION)
+    ).order_by(Textbook.id).all()
+    
+    textbook_ids = []
+    for textbook in textbooks:
+        if active_job(db, textbook.id):
+            continue
+        enqueue_job(
+            db, textbook.id, os.path.join(UPLOAD_DIR, textbook.filename),
+            kind="reextract", page_count=textbook.total_pages
+        )
+        textbook_ids.append(textbook.id)
+    
+    return {
+        "message": f"Re-extracting {len(textbook_ids)} textbooks",
+        "textbook_ids": textbook_ids,
+        "extractor_version": EXTRACTOR_VERSION
+    }
+
+@router.get("/jobs")
+async def get_jobs(status: Optional[str] = None, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """
+    List processing jobs: running, then queued in claim order, then finished
+    """
+    return await db.run_sync(list_jobs, status, limit)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get a single processing job
+    """
+    job = await db.get(ProcessingJob, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job_summary(job)
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_processing_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Cancel a queued job, or ask a running job to stop at its next chunk
+    """
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status not in ("pending", "running"):
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    
+    job = cancel_job(db, job)
+    
+    return {
+        "message": "Job cancelled" if job.status == "cancelled" else "Cancellation requested",
+        "job": job_summary(job)
     }
 
 @router.get("/textbooks")
-async def list_textbooks(db: Session = Depends(get_db)):
+async def list_textbooks(db: AsyncSession = Depends(get_async_db)):
     """
     List all uploaded textbooks
     """
-    textbooks = db.query(Textbook).order_by(Textbook.upload_date.desc()).all()
+    chapter_counts = select(
+        Chapter.textbook_id,
+        func.count(Chapter.id).label('chapters_count')
+    ).group_by(Chapter.textbook_id).subquery()
+    
+    textbooks = (await db.execute(
+        select(Textbook, chapter_counts.c.chapters_count)
+        .outerjoin(chapter_counts, chapter_counts.c.textbook_id == Textbook.id)
+        .order_by(Textbook.upload_date.desc())
+    )).all()
     
     return [{
         "id": book.id,
@@ -102,17 +350,77 @@ async def list_textbooks(db: Session = Depends(get_db)):
         "status": book.processing_status,
         "upload_date": book.upload_date,
         "total_pages": book.total_pages,
-        "chapters_count": len(book.chapters) if book.chapters else 0
-    } for book in textbooks]
+        "chapters_count": chapters_count or 0
+    } for book, chapters_count in textbooks]
 
-def process_pdf_background(file_path: str, textbook_id: int, db: Session):
+def _register_upload(db: Session, upload: Dict, filename: str, file_path: str, profile: bool) -> Dict:
     """
-    Background task to process PDF file
+    Record a received upload and queue its processing job, or discard it if
+    an identical textbook already exists
     """
-    processor = PDFProcessor(db)
-    success = processor.process_pdf(file_path, textbook_id)
+    # A byte-identical textbook that is processed or in flight is reused as-is
+    existing = db.query(Textbook).filter(
+        Textbook.content_hash == upload['content_hash'],
+        Textbook.processing_status != "failed"
+    ).order_by(Textbook.id).first()
+    
+    if existing:
+        os.remove(upload['temp_path'])
+        message = "Identical file already uploaded"
+        if profile:
+            # Nothing is processed for a duplicate, so there is nothing to profile
+            message += "; it was not reprocessed, so no profile was recorded"
+        return {
+            "message": message,
+            "textbook_id": existing.id,
+            "filename": existing.filename,
+            "status": existing.processing_status,
+            "duplicate": True,
+            "profiled": False
+        }
+    
+    # The file only appears under its final name once fully written. Linking
+    # fails instead of replacing a file that already has the name
+    os.link(upload['temp_path'], file_path)
+    os.remove(upload['temp_path'])
+    
+    try:
+        # Create textbook record
+        textbook = Textbook(
+            filename=filename,
+            original_name=upload['original_name'],
+            title=upload['original_name'].replace('.pdf', ''),
+            file_size=upload['size'],
+            content_hash=upload['content_hash'],
+            processing_status="pending"
+        )
+        
+        db.add(textbook)
+        db.commit()
+        db.refresh(textbook)
+        
+        # Queue processing for the worker pool, smaller textbooks first
+        job = enqueue_job(db, textbook.id, file_path, page_count=_count_pages(file_path), profile=profile)
+    except Exception:
+        os.remove(file_path)
+        raise
     
-    if not success:
-        # Clean up file if processing failed
-        if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+    return {
+        "message": "File uploaded successfully",
+        "textbook_id": textbook.id,
+        "job_id": job.id,
+        "filename": filename,
+        "status": "pending",
+        "duplicate": False,
+        "profiled": profile
+    }
+
+def _count_pages(file_path: str) -> Optional[int]:
+    """
+    Page count from the PDF's page tree, used to order the job queue
+    """
+    try:
+        return len(PyPDF2.PdfReader(file_path).pages)
+    except Exception as e:
+        logger.error(f"Error counting pages of {file_path}: {str(e)}")
+        return None
@@ -0,0 +1,75 @@
+import bisect
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from .models import Chapter
+
+class ChapterIndex:
+    """
+    In-memory interval index resolving page numbers to a textbook's chapters.
+
+    The chapter ranges are flattened once into sorted, non-overlapping page
+    segments, each labelled with the most specific chapter covering it (the
+    deepest level, then the latest start). Lookups are a single bisect.
+    """
+
+    def __init__(self, chapters: List[Tuple[int, int, Optional[int], int]]):
+        """
+        chapters: (chapter_id, page_start, page_end, level) tuples
+        """
+        intervals = _resolve_page_ends(chapters)
+
+        boundaries = sorted(
+            {start for _, start, _, _ in intervals} | {end + 1 for _, _, end, _ in intervals if end is not None}
+        )
+
+        self._segment_starts = []
+        self._segment_chapters = []
+
+        for index, segment_start in enumerate(boundaries):
+            covering = [
+                interval for interval in intervals
+                if interval[1] <= segment_start and (interval[2] is None or segment_start <= interval[2])
+            ]
+            best = max(covering, key=lambda interval: (interval[3], interval[1], interval[0]), default=None)
+            self._segment_starts.append(segment_start)
+            self._segment_chapters.append(best[0] if best else None)
+
+    @classmethod
+    def load(cls, db: Session, textbook_id: int) -> "ChapterIndex":
+        rows = db.query(
+            Chapter.id, Chapter.page_start, Chapter.page_end, Chapter.level
+        ).filter(
+            Chapter.textbook_id == textbook_id,
+            Chapter.page_start.isnot(None)
+        ).all()
+        return cls([(row.id, row.page_start, row.page_end, row.level or 1) for row in rows])
+
+    def __len__(self) -> int:
+        return len(self._segment_starts)
+
+    def chapter_id_for_page(self, page_num: int) -> Optional[int]:
+        """
+        Id of the most specific chapter containing page_num, or None
+        """
+        index = bisect.bisect_right(self._segment_starts, page_num) - 1
+        if index < 0:
+            return None
+        return self._segment_chapters[index]
+
+def _resolve_page_ends(chapters):
+    """
+    Chapters stored without page_end run until the next chapter at the same
+    or a higher level starts, matching how page ranges are computed on import
+    """
+    ordered = sorted(chapters, key=lambda chapter: (chapter[1], chapter[3], chapter[0]))
+    resolved = []
+
+    for index, (chapter_id, page_start, page_end, level) in enumerate(ordered):
+        if page_end is None:
+            for _, next_start, _, next_level in ordered[index + 1:]:
+                if next_level <= level and next_start > page_start:
+                    page_end = next_start - 1
+                    break
+        resolved.append((chapter_id, page_start, page_end, level))
+
+    return resolved
@@ -1,17 +1,58 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+from .search import create_search_index
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./textbook_questions.db"
 
+# Storage tuning applied to every connection
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")  # WAL lets readers run while a job commits
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL only risks the last commits on power loss in WAL mode
+SQLITE_CACHE_MB = int(os.environ.get("SQLITE_CACHE_MB", 64))  # Page cache per connection
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", 256))  # Memory-mapped I/O window; 0 disables
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 30))  # Seconds a connection waits for a lock before failing
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Same database through aiosqlite, opened read-only, for the query endpoints;
+# request handlers must not block the event loop and never write
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///file:", 1) + "?mode=ro&uri=true"
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"timeout": SQLITE_BUSY_TIMEOUT})
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def _apply_pragmas(dbapi_connection, read_only: bool):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            # Persistent in the database file; read-only connections cannot change it
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_MB * 1024}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+@event.listens_for(engine, "connect")
+def _tune_connection(dbapi_connection, connection_record):
+    _apply_pragmas(dbapi_connection, read_only=False)
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _tune_read_connection(dbapi_connection, connection_record):
+    _apply_pragmas(dbapi_connection, read_only=True)
+
 Base = declarative_base()
 
 def get_db():
@@ -21,5 +62,36 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    with engine.begin() as connection:
+        create_search_index(connection)
+
+def _add_missing_columns():
+    """
+    Add columns introduced after a table was first created.
+
+    create_all only creates missing tables, so existing SQLite files would
+    otherwise lack any column added to the models later on.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+                if column.index:
+                    connection.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} '
+                        f'ON {table.name} ({column.name})'
+                    ))
\ No newline at end of file
@@ -0,0 +1,150 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import insert, update
+from .database import SessionLocal
+from .metrics import PIPELINE_STAGE_SECONDS, WRITER_SUBMISSIONS, WRITER_TRANSACTIONS
+from .models import ProcessingJob, Question, Textbook
+from .question_writer import INSERT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+WRITER_MAX_DELAY = float(os.environ.get("SQLITE_WRITER_MAX_DELAY", 0.05))  # Seconds the writer waits for more submissions to group
+WRITER_MAX_ROWS = int(os.environ.get("SQLITE_WRITER_MAX_ROWS", 5000))  # Question rows after which a group is written straight away
+WRITE_ACK_TIMEOUT = 300.0  # Seconds a job worker waits for its write to be applied before exiting
+
+_channel: Optional[Callable] = None  # How this process hands checkpoint writes to the writer
+
+def set_write_channel(channel: Optional[Callable]):
+    """
+    Route checkpoint writes made in this process through channel, which
+    blocks until the write is applied and raises if it failed; job workers
+    send them to the web process's writer this way
+    """
+    global _channel
+    _channel = channel
+
+def has_write_channel() -> bool:
+    return _channel is not None
+
+def submit_write(rows: List[Dict], job_id: int, job_values: Dict, textbook_id: int, textbook_values: Dict):
+    """
+    Have the writer insert rows and update the job and textbook in one
+    transaction; returns once it is committed
+    """
+    _channel(rows, job_id, job_values, textbook_id, textbook_values)
+
+class DatabaseWriter:
+    """
+    Single thread applying the checkpoint writes of all processing jobs.
+
+    Submissions that arrive within WRITER_MAX_DELAY of each other are
+    coalesced into one transaction, so concurrent jobs share commits instead
+    of queueing for the SQLite write lock. If a grouped transaction fails,
+    its submissions are retried one by one so only the faulty one fails.
+    """
+
+    def __init__(self, max_delay: float = WRITER_MAX_DELAY, max_rows: int = WRITER_MAX_ROWS):
+        self.max_delay = max_delay
+        self.max_rows = max(1, max_rows)
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Apply everything already submitted, then stop the thread
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self,
+        rows: List[Dict],
+        job_id: int,
+        job_values: Dict,
+        textbook_id: int,
+        textbook_values: Dict,
+        done: Callable[[Optional[str]], None]
+    ):
+        """
+        Queue a write; done is called from the writer thread with None once it
+        is committed, or with the error message if it failed
+        """
+        self._queue.put((rows, job_id, job_values, textbook_id, textbook_values, done))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            group = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while rows < self.max_rows:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                rows += len(item[0])
+
+            self._apply_group(group)
+            if stopping:
+                return
+
+    def _apply_group(self, group: List[tuple]):
+        db = SessionLocal()
+        try:
+            with PIPELINE_STAGE_SECONDS.time("writer_commit"):
+                for write in group:
+                    self._apply(db, *write[:5])
+                db.commit()
+            WRITER_TRANSACTIONS.inc()
+            WRITER_SUBMISSIONS.inc(len(group))
+            results = [(write, None) for write in group]
+        except Exception as e:
+            db.rollback()
+            if len(group) == 1:
+                logger.error(f"Database write for job {group[0][1]} failed: {str(e)}")
+                results = [(group[0], str(e))]
+            else:
+                logger.error(f"Grouped write of {len(group)} submissions failed, retrying separately: {str(e)}")
+                results = None
+        finally:
+            db.close()
+
+        if results is None:
+            for write in group:
+                self._apply_group([write])
+            return
+
+        for write, error in results:
+            try:
+                write[5](error)
+            except Exception as e:
+                logger.error(f"Acknowledging write for job {write[1]} failed: {str(e)}")
+
+    def _apply(self, db, rows: List[Dict], job_id: int, job_values: Dict, textbook_id: int, textbook_values: Dict):
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            db.execute(insert(Question), rows[start:start + INSERT_BATCH_SIZE])
+        if job_values:
+            db.execute(update(ProcessingJob).where(ProcessingJob.id == job_id).values(**job_values))
+        if textbook_values:
+            db.execute(update(Textbook).where(Textbook.id == textbook_id).values(**textbook_values))
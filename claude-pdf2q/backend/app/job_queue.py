@@ -0,0 +1,506 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .db_writer import DatabaseWriter, WRITE_ACK_TIMEOUT, set_write_channel
+from .metrics import export_metrics, import_metrics
+from .models import ProcessingJob, Textbook
+from .pdf_processor import PDFProcessor, EXTRACT_WORKERS
+from .profiling import run_profiled
+from .progress import progress_board, publish_progress, set_progress_sink
+
+logger = logging.getLogger(__name__)
+
+# Worker processes claiming jobs; each job's page extraction is limited to its share of the CPUs
+JOB_WORKERS = int(os.environ.get("PDF_JOB_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get("PDF_JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = float(os.environ.get("PDF_JOB_RETRY_DELAY", 30))  # Seconds before the first retry, doubled per attempt
+JOB_STALE_SECONDS = float(os.environ.get("PDF_JOB_STALE_SECONDS", 300))  # Running jobs without a heartbeat this long are requeued
+JOB_POLL_INTERVAL = 1.0  # Seconds an idle worker waits before looking for work again
+JOB_HEARTBEAT_INTERVAL = 15.0  # Seconds between heartbeats (and metric reports) from a worker
+
+ACTIVE_STATUSES = ("pending", "running")
+
+def enqueue_job(
+    db: Session,
+    textbook_id: int,
+    file_path: str,
+    kind: str = "extract",
+    page_count: Optional[int] = None,
+    profile: bool = False,
+    retry_skipped: bool = False
+) -> ProcessingJob:
+    """
+    Queue a job for a textbook and commit it.
+
+    A pending or running job of the same kind is returned as-is. Extract jobs
+    reuse the textbook's previous extract job so a retry keeps its checkpoint,
+    and get a fresh allowance of attempts.
+    """
+    query = db.query(ProcessingJob).filter(
+        ProcessingJob.textbook_id == textbook_id,
+        ProcessingJob.kind == kind
+    ).order_by(ProcessingJob.id.desc())
+
+    job = query.filter(ProcessingJob.status.in_(ACTIVE_STATUSES)).first()
+    if job is not None:
+        return job
+
+    job = query.first() if kind == "extract" else None
+    if job is None:
+        job = ProcessingJob(textbook_id=textbook_id, kind=kind, last_committed_page=0, attempts=0)
+        db.add(job)
+
+    job.status = "pending"
+    job.file_path = file_path
+    job.page_count = page_count if page_count is not None else job.page_count
+    job.profile = profile
+    job.retry_skipped = retry_skipped
+    if kind == "extract":
+        job.budget_start_seconds = db.query(Textbook.processing_seconds).filter(
+            Textbook.id == textbook_id
+        ).scalar() or 0.0
+    job.max_attempts = (job.attempts or 0) + JOB_MAX_ATTEMPTS
+    job.next_attempt_date = None
+    job.worker_id = None
+    job.cancel_requested = False
+    job.error = None
+    db.commit()
+    db.refresh(job)
+    publish_progress(textbook_id, status="pending", job_id=job.id, kind=kind, next_attempt_date=None, error=None)
+    return job
+
+def cancel_job(db: Session, job: ProcessingJob) -> ProcessingJob:
+    """
+    Cancel a pending or running job and commit.
+
+    A pending job is cancelled straight away. A running job is flagged, and
+    its worker stops at the next chunk boundary; pages committed before that
+    are kept, so retrying the textbook resumes from its checkpoint.
+    """
+    if job.status == "pending":
+        job.status = "cancelled"
+        job.error = "Cancelled by request"
+        if job.kind == "extract":
+            db.query(Textbook).filter(Textbook.id == job.textbook_id).update({"processing_status": "cancelled"})
+    elif job.status == "running":
+        job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    publish_progress(job.textbook_id, status=job.status, cancel_requested=bool(job.cancel_requested))
+    return job
+
+def active_job(db: Session, textbook_id: int) -> Optional[ProcessingJob]:
+    """
+    The textbook's pending or running job of any kind, if there is one
+    """
+    return db.query(ProcessingJob).filter(
+        ProcessingJob.textbook_id == textbook_id,
+        ProcessingJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(ProcessingJob.id).first()
+
+def _remaining_pages():
+    """
+    Shortest-job-first sort key: pages left to process, unknown sizes last
+    """
+    return (
+        ProcessingJob.page_count.is_(None),
+        func.coalesce(ProcessingJob.page_count, 0) - func.coalesce(ProcessingJob.last_committed_page, 0),
+        ProcessingJob.id
+    )
+
+def list_jobs(db: Session, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """
+    Running jobs, then pending jobs in the order workers will claim them,
+    then finished jobs newest first. Pending jobs carry their queue position.
+    """
+    statuses = [status] if status else ["running", "pending", "completed", "failed", "cancelled"]
+    results = []
+
+    for job_status in statuses:
+        query = db.query(ProcessingJob).filter(ProcessingJob.status == job_status)
+        if job_status == "pending":
+            query = query.order_by(*_remaining_pages())
+        else:
+            query = query.order_by(ProcessingJob.updated_date.desc())
+
+        for position, job in enumerate(query.limit(limit - len(results)).all(), 1):
+            results.append(job_summary(job, position if job_status == "pending" else None))
+        if len(results) >= limit:
+            break
+
+    return results
+
+def job_summary(job: ProcessingJob, queue_position: Optional[int] = None) -> Dict:
+    return {
+        "id": job.id,
+        "textbook_id": job.textbook_id,
+        "kind": job.kind,
+        "status": job.status,
+        "queue_position": queue_position,
+        "page_count": job.page_count,
+        "last_committed_page": job.last_committed_page,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "next_attempt_date": job.next_attempt_date,
+        "worker_id": job.worker_id,
+        "heartbeat_date": job.heartbeat_date,
+        "cancel_requested": bool(job.cancel_requested),
+        "profile": bool(job.profile),
+        "error": job.error,
+        "created_date": job.created_date,
+        "updated_date": job.updated_date
+    }
+
+def requeue_stale_jobs(
+    db: Session,
+    stale_seconds: float = JOB_STALE_SECONDS,
+    worker_prefix: Optional[str] = None
+) -> int:
+    """
+    Return running jobs whose worker stopped heartbeating to the queue, and
+    any run by workers whose id starts with worker_prefix; they resume from
+    their last checkpoint
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    abandoned = (ProcessingJob.heartbeat_date.is_(None)) | (ProcessingJob.heartbeat_date < cutoff)
+    if worker_prefix:
+        abandoned = abandoned | ProcessingJob.worker_id.startswith(worker_prefix, autoescape=True)
+    result = db.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.status == "running")
+        .where(abandoned)
+        .values(status="pending", worker_id=None)
+    )
+    db.commit()
+    if result.rowcount:
+        logger.info(f"Requeued {result.rowcount} processing jobs without a live worker")
+    return result.rowcount
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[ProcessingJob]:
+    """
+    Atomically claim the shortest runnable pending job for worker_id.
+
+    The conditional UPDATE only succeeds for one worker per job, so workers in
+    separate processes can race for the same row safely. Textbooks with a job
+    already running are skipped.
+    """
+    now = datetime.utcnow()
+    busy_textbooks = db.query(ProcessingJob.textbook_id).filter(ProcessingJob.status == "running")
+
+    while True:
+        candidate = db.query(ProcessingJob.id).filter(
+            ProcessingJob.status == "pending",
+            (ProcessingJob.next_attempt_date.is_(None)) | (ProcessingJob.next_attempt_date <= now),
+            ProcessingJob.textbook_id.notin_(busy_textbooks)
+        ).order_by(*_remaining_pages()).first()
+        if candidate is None:
+            return None
+
+        result = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == candidate.id, ProcessingJob.status == "pending")
+            .values(status="running", worker_id=worker_id, heartbeat_date=now)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.query(ProcessingJob).filter(ProcessingJob.id == candidate.id).first()
+
+def run_job(db: Session, job: ProcessingJob, extract_workers: int):
+    """
+    Run a claimed job in this process, then schedule a retry if it failed
+    with attempts to spare
+    """
+    job_id, textbook_id = job.id, job.textbook_id
+    logger.info(f"Starting {job.kind} job {job_id} for textbook {textbook_id}")
+
+    try:
+        if job.kind == "reextract":
+            processor = PDFProcessor(db, workers=1, retry_skipped=job.retry_skipped)
+            processor.reextract_questions(job.file_path, textbook_id, job)
+        elif job.profile:
+            processor = PDFProcessor(db, workers=1, retry_skipped=job.retry_skipped)
+            run_profiled(textbook_id, processor.process_pdf, job.file_path, textbook_id)
+        else:
+            processor = PDFProcessor(db, workers=extract_workers, retry_skipped=job.retry_skipped)
+            processor.process_pdf(job.file_path, textbook_id)
+    except Exception as e:
+        logger.error(f"Job {job_id} crashed: {str(e)}")
+        db.rollback()
+        db.query(ProcessingJob).filter(ProcessingJob.id == job_id).update(
+            {"status": "failed", "error": str(e)}
+        )
+        db.commit()
+
+    db.expire_all()
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    if job.status == "running":
+        # The processor always records an outcome; anything else is a failure
+        job.status = "failed"
+    job.worker_id = None
+
+    if job.status == "failed" and (job.attempts or 0) < (job.max_attempts or 0):
+        delay = JOB_RETRY_DELAY * 2 ** max(0, (job.attempts or 1) - 1)
+        job.status = "pending"
+        job.next_attempt_date = datetime.utcnow() + timedelta(seconds=delay)
+        if job.kind == "extract":
+            db.query(Textbook).filter(Textbook.id == textbook_id).update({"processing_status": "pending"})
+        logger.info(f"Job {job_id} failed, retrying in {delay:.0f}s (attempt {job.attempts} of {job.max_attempts})")
+    db.commit()
+
+    publish_progress(
+        textbook_id,
+        status=job.status,
+        job_id=job_id,
+        next_attempt_date=job.next_attempt_date.isoformat() if job.next_attempt_date else None,
+        error=job.error
+    )
+
+def worker_main(worker_id: str, stop_flag, report_queue, ack_queue, extract_workers: int):
+    """
+    Entry point of a job worker process: claim and run jobs until stop_flag
+    is set or the server process that started it is gone. Metrics, job progress and checkpoint writes are sent to the web
+    process on report_queue; write results come back on ack_queue, tagged
+    with the sequence number of the write they answer.
+    """
+    stopped = threading.Event()
+    set_progress_sink(lambda textbook_id, fields: report_queue.put(("progress", textbook_id, fields)))
+    sequence = itertools.count(1)
+
+    def write(*payload):
+        seq = next(sequence)
+        report_queue.put(("write", worker_id, (seq, payload)))
+        deadline = time.monotonic() + WRITE_ACK_TIMEOUT
+        while True:
+            try:
+                acked_seq, error = ack_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                # The write may still be applied after this, moving the job's checkpoint
+                # under whatever ran next; exit so the pool requeues the job instead
+                logger.critical(f"Worker {worker_id} write {seq} not acknowledged within {WRITE_ACK_TIMEOUT:g}s, exiting")
+                os._exit(1)
+            if acked_seq == seq:
+                break
+            logger.warning(f"Worker {worker_id} dropped acknowledgement of write {acked_seq} while waiting for {seq}")
+        if error is not None:
+            raise RuntimeError(f"Database write failed: {error}")
+
+    set_write_channel(write)
+    parent = multiprocessing.parent_process()
+
+    def heartbeat():
+        # Separate session, since the job's own session is busy in the main thread
+        while not stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            if not parent.is_alive():
+                # Stop heartbeating the job so a restarted server can requeue it
+                logger.critical(f"Worker {worker_id} lost its server process, exiting")
+                os._exit(1)
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(ProcessingJob)
+                    .where(ProcessingJob.worker_id == worker_id, ProcessingJob.status == "running")
+                    .values(heartbeat_date=datetime.utcnow())
+                )
+                db.commit()
+            except Exception as e:
+                logger.error(f"Worker {worker_id} heartbeat failed: {str(e)}")
+            finally:
+                db.close()
+            report_queue.put(("metrics", worker_id, export_metrics()))
+
+    threading.Thread(target=heartbeat, name=f"{worker_id}-heartbeat", daemon=True).start()
+
+    db = SessionLocal()
+    last_requeue = datetime.min
+    report_queue.put(("ready", worker_id, None))
+    try:
+        while not stop_flag.value:
+            if not parent.is_alive():
+                logger.warning(f"Worker {worker_id} lost its server process, stopping")
+                break
+            if datetime.utcnow() - last_requeue > timedelta(seconds=JOB_HEARTBEAT_INTERVAL):
+                requeue_stale_jobs(db)
+                last_requeue = datetime.utcnow()
+            job = claim_next_job(db, worker_id)
+            if job is None:
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+            run_job(db, job, extract_workers)
+            report_queue.put(("metrics", worker_id, export_metrics()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        db.close()
+
+class WorkerPool:
+    """
+    Pool of worker processes that claim jobs from the processing_jobs table.
+
+    Parsing runs in the workers, never in the web process. Jobs survive
+    restarts: jobs left running by a previous server are requeued once their
+    heartbeat is stale and resume from their checkpoints. Workers report
+    their metrics back so /metrics still covers the processing pipeline, and
+    publish job progress to the progress board for streaming. Their checkpoint writes are applied
+    by a single database writer thread here, so jobs never contend for the
+    SQLite write lock with each other.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._stop_flag = None
+        self._report_queue = None
+        self._report_thread = None
+        self._ack_queues = {}  # worker id -> queue its write results are sent on
+        self._ready = set()  # Ids of workers that have started polling for jobs
+        self._writer = DatabaseWriter()
+        self._extract_workers = 1
+        self._spawned = itertools.count(1)
+
+    def start(self):
+        if self._processes:
+            return
+
+        db = SessionLocal()
+        try:
+            # Only jobs nobody is heartbeating, or left by this process's earlier workers;
+            # another live server's jobs keep running
+            requeue_stale_jobs(db, worker_prefix=self._worker_prefix())
+        finally:
+            db.close()
+
+        self._extract_workers = max(1, EXTRACT_WORKERS // self.workers)
+        # A lock-free flag the workers poll: unlike an Event, setting it cannot
+        # block on a worker that was killed while waiting on it
+        self._stop_flag = self._context.Value('b', 0, lock=False)
+        self._report_queue = self._context.Queue()
+        self._writer.start()
+        self._processes = [self._spawn(index) for index in range(self.workers)]
+
+        self._report_thread = threading.Thread(target=self._collect_reports, name="job-reports", daemon=True)
+        self._report_thread.start()
+        logger.info(f"Started {self.workers} processing workers")
+
+    @property
+    def processes(self) -> List[multiprocessing.process.BaseProcess]:
+        """
+        The pool's current worker processes
+        """
+        return list(self._processes)
+
+    def is_ready(self) -> bool:
+        """
+        Whether every current worker has started up and is polling for jobs
+        """
+        return bool(self._processes) and all(process.name in self._ready for process in self._processes)
+
+    def _spawn(self, index: int):
+        # Ids are never reused, so a replacement cannot heartbeat its predecessor's job
+        worker_id = f"{self._worker_prefix()}{next(self._spawned)}"
+        self._ack_queues[worker_id] = self._context.Queue()
+        # Not daemonic: workers start their own page-extraction process pools
+        process = self._context.Process(
+            target=worker_main,
+            args=(worker_id, self._stop_flag, self._report_queue, self._ack_queues[worker_id], self._extract_workers),
+            name=worker_id
+        )
+        process.start()
+        return process
+
+    def _worker_prefix(self) -> str:
+        return f"worker-{os.getpid()}-"
+
+    def _replace_dead_workers(self):
+        """
+        Restart workers that died, e.g. killed for running out of memory, and
+        requeue the job each was running
+        """
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or self._stop_flag.value:
+                continue
+            logger.error(f"Worker {process.name} exited with code {process.exitcode}, restarting")
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(ProcessingJob)
+                    .where(ProcessingJob.worker_id == process.name, ProcessingJob.status == "running")
+                    .values(status="pending", worker_id=None)
+                )
+                db.commit()
+            finally:
+                db.close()
+            self._ack_queues.pop(process.name, None)
+            self._ready.discard(process.name)
+            self._processes[index] = self._spawn(index)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Ask workers to stop after their current job; terminate any still busy
+        after timeout; their jobs are requeued on the next start
+        """
+        if not self._processes:
+            return
+
+        self._stop_flag.value = 1
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+        self._report_queue.put(None)
+        self._report_thread.join(timeout)
+        self._writer.stop(timeout)
+        self._ack_queues = {}
+        self._ready = set()
+        logger.info("Stopped processing workers")
+
+    def _collect_reports(self):
+        """
+        Merge metric snapshots and progress sent by workers, note which have
+        started, hand their checkpoint writes to the writer and keep the pool
+        at full size
+        """
+        while True:
+            try:
+                item = self._report_queue.get(timeout=JOB_POLL_INTERVAL * 5)
+            except queue.Empty:
+                item = ()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            if item:
+                kind, key, payload = item
+                if kind == "metrics":
+                    import_metrics(key, payload)
+                elif kind == "write":
+                    seq, write = payload
+                    self._writer.submit(*write, done=self._acknowledge(key, seq))
+                elif kind == "ready":
+                    self._ready.add(key)
+                else:
+                    progress_board.update(key, payload)
+            self._replace_dead_workers()
+
+    def _acknowledge(self, worker_id: str, seq: int):
+        ack_queue = self._ack_queues.get(worker_id)
+
+        def done(error):
+            if ack_queue is not None:
+                ack_queue.put((seq, error))
+
+        return done
+
+worker_pool = WorkerPool()
@@ -0,0 +1,46 @@
+from typing import Dict, Iterable, List
+
+try:
+    import ahocorasick
+except ImportError as e:
+    raise ImportError(
+        "Question keyword matching requires pyahocorasick; install it with "
+        "pip install -r requirements.txt"
+    ) from e
+
+class KeywordMatcher:
+    """
+    Precomputed multi-pattern substring matcher over named keyword categories.
+
+    Each category gets a bit; scan() returns the OR of the bits of every
+    keyword found in the text. The keywords are compiled into one
+    Aho-Corasick automaton, so the text is walked once however many
+    keywords there are.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.bits = {name: 1 << index for index, name in enumerate(categories)}
+
+        masks = {}
+        for name, keywords in categories.items():
+            for keyword in keywords:
+                masks[keyword] = masks.get(keyword, 0) | self.bits[name]
+        self._masks = masks
+
+        self._automaton = ahocorasick.Automaton()
+        for keyword, mask in masks.items():
+            self._automaton.add_word(keyword, mask)
+        self._automaton.make_automaton()
+
+    def scan(self, text: str) -> int:
+        """
+        Bitmask of the categories with at least one keyword in text
+        """
+        mask = 0
+        for _, keyword_mask in self._automaton.iter(text):
+            mask |= keyword_mask
+        return mask
+
+    def scan_many(self, texts: Iterable[str]) -> List[int]:
+        scan = self.scan
+        return [scan(text) for text in texts]
@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from .database import create_tables
+from .job_queue import worker_pool
+from .metrics import CONTENT_TYPE, RequestMetricsMiddleware, render_metrics
 from .api import upload, questions
 
 app = FastAPI(
@@ -19,9 +22,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route and response status, for routers using TimedRoute
+app.add_middleware(RequestMetricsMiddleware)
+
 # Create database tables
 create_tables()
 
+# Processing runs in a pool of worker processes fed from the processing_jobs table;
+# jobs interrupted by a restart are requeued when the pool starts
+@app.on_event("startup")
+async def start_workers():
+    worker_pool.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    worker_pool.stop()
+
 # Include API routers
 app.include_router(upload.router, prefix="/api", tags=["upload"])
 app.include_router(questions.router, prefix="/api", tags=["questions"])
@@ -46,4 +62,11 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Pipeline stage timings and API latency histograms in the Prometheus text format
+    """
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
\ No newline at end of file
@@ -0,0 +1,71 @@
+import gc
+import os
+import sys
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+class MemoryLimitExceeded(Exception):
+    """
+    Raised when a processing job's resident memory stays above its ceiling
+    """
+
+def current_rss_bytes() -> int:
+    """
+    Resident set size of this process in bytes
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # No procfs: fall back to the lifetime peak, which is the best available
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """
+    Lifetime peak resident set size of this process in bytes
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MemoryMonitor:
+    """
+    Tracks peak RSS over a job and enforces an optional memory ceiling
+    """
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        self.limit_bytes = limit_bytes or None
+        self.peak_bytes = 0
+
+    def observe(self, rss_bytes: int) -> int:
+        """
+        Record an RSS sample, e.g. one reported by a worker process
+        """
+        self.peak_bytes = max(self.peak_bytes, rss_bytes)
+        return rss_bytes
+
+    def check(self) -> int:
+        """
+        Sample this process and raise MemoryLimitExceeded if it is over the ceiling
+        """
+        rss_bytes = self.observe(current_rss_bytes())
+
+        if self.limit_bytes and rss_bytes > self.limit_bytes:
+            # pdfminer objects form reference cycles; collect before giving up
+            gc.collect()
+            rss_bytes = current_rss_bytes()
+            if rss_bytes > self.limit_bytes:
+                raise MemoryLimitExceeded(
+                    f"RSS {rss_bytes // (1024 * 1024)} MB exceeds limit of "
+                    f"{self.limit_bytes // (1024 * 1024)} MB"
+                )
+
+        return rss_bytes
@@ -0,0 +1,238 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upper bounds in seconds; covers sub-millisecond regex scans up to multi-minute PDFs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+_remote_snapshots: Dict[str, Dict] = {}  # source (e.g. job worker) -> export_metrics() result
+_remote_lock = threading.Lock()
+
+class Counter:
+    """
+    Monotonic counter rendered in the Prometheus text format
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def export(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, remote: List[Dict] = ()) -> List[str]:
+        values = self.export()
+        for snapshot in remote:
+            for labelvalues, value in snapshot.items():
+                values[labelvalues] = values.get(labelvalues, 0) + value
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """
+    Cumulative-bucket histogram rendered in the Prometheus text format
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def export(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {
+                labelvalues: [list(counts), total, count]
+                for labelvalues, (counts, total, count) in self._series.items()
+            }
+
+    def render(self, remote: List[Dict] = ()) -> List[str]:
+        series = self.export()
+        for snapshot in remote:
+            for labelvalues, (counts, total, count) in snapshot.items():
+                merged = series.setdefault(labelvalues, [[0] * len(self.buckets), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _labels(self.labelnames + ('le',), labelvalues + (_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames + ('le',), labelvalues + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pdf_pipeline_stage_seconds",
+    "Time spent in each stage of PDF processing",
+    ("stage",)
+)
+PAGES_PROCESSED = Counter("pdf_pages_processed_total", "Pages with text handed to the question extractor")
+QUESTIONS_EXTRACTED = Counter("pdf_questions_extracted_total", "Questions buffered for insert")
+PAGES_SKIPPED = Counter("pdf_pages_skipped_total", "Pages skipped because text extraction timed out")
+WRITER_SUBMISSIONS = Counter("db_writer_submissions_total", "Checkpoint writes applied by the database writer")
+WRITER_TRANSACTIONS = Counter("db_writer_transactions_total", "Transactions the database writer committed them in")
+SAMPLER_LOADS = Counter("question_sampler_loads_total", "Question id lists loaded by the random question sampler")
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "API request latency by route",
+    ("method", "route", "status")
+)
+
+def render_metrics() -> str:
+    """
+    All registered metrics in the Prometheus text exposition format, including
+    the latest snapshots reported by other processes
+    """
+    with _remote_lock:
+        snapshots = list(_remote_snapshots.values())
+
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render([snapshot.get(metric.name, {}) for snapshot in snapshots]))
+    return "\n".join(lines) + "\n"
+
+def export_metrics() -> Dict[str, Dict]:
+    """
+    Picklable snapshot of this process's cumulative metric values
+    """
+    return {metric.name: metric.export() for metric in _registry}
+
+def import_metrics(source: str, snapshot: Dict[str, Dict]):
+    """
+    Record another process's latest export_metrics() snapshot so it is
+    included in render_metrics(); a newer snapshot from the same source
+    replaces the older one
+    """
+    with _remote_lock:
+        _remote_snapshots[source] = snapshot
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """
+    Yield from iterable, recording the time spent producing each item under stage
+    """
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+        yield item
+
+class TimedRoute(APIRoute):
+    """
+    Route class marking a router's routes for RequestMetricsMiddleware, which
+    records their latency labelled with the route template rather than the
+    concrete path
+    """
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording the latency of requests to TimedRoute routes in
+    HTTP_REQUEST_SECONDS, with the status of the response actually sent, so
+    errors answered by exception handlers (e.g. 422 for validation errors)
+    keep their own status. Latency runs to the start of the response, so
+    streamed responses count only their time to first byte.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status: int):
+            nonlocal recorded
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            if recorded or not isinstance(route, TimedRoute):
+                return
+            recorded = True
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route.path, str(status))
+
+        async def timed_send(message: Message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            # Unhandled; the server answers with a 500
+            record(500)
+            raise
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -11,9 +11,16 @@ class Textbook(Base):
     original_name = Column(String)
     title = Column(String)
     upload_date = Column(DateTime, default=datetime.utcnow)
-    processing_status = Column(String, default="pending")  # pending, processing, completed, failed
+    processing_status = Column(String, default="pending")  # pending, processing, completed, failed, cancelled
     total_pages = Column(Integer)
     file_size = Column(Integer)
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded file
+    peak_rss_bytes = Column(Integer, nullable=True)  # Peak resident memory of the last processing job
+    duplicates_suppressed = Column(Integer, default=0)  # Near-duplicate questions skipped by the last job
+    extractor_version = Column(Integer, nullable=True)  # EXTRACTOR_VERSION the stored questions came from
+    processing_seconds = Column(Float, nullable=True)  # Wall-clock time spent processing, across all attempts
+    skipped_pages = Column(Text, nullable=True)  # JSON list of {"page", "seconds"} for pages whose extraction timed out
+    skipped_page_seconds = Column(Float, nullable=True)  # Time lost to those pages
     
     chapters = relationship("Chapter", back_populates="textbook", cascade="all, delete-orphan")
 
@@ -23,7 +30,8 @@ class Chapter(Base):
     id = Column(Integer, primary_key=True, index=True)
     textbook_id = Column(Integer, ForeignKey("textbooks.id"))
     title = Column(String)
-    chapter_number = Column(Integer)
+    chapter_number = Column(Integer)  # Position among the entries sharing its parent
+    label = Column(String, nullable=True)  # Dotted section number, e.g. "1.10"
     parent_id = Column(Integer, ForeignKey("chapters.id"), nullable=True)  # For subchapters
     page_start = Column(Integer)
     page_end = Column(Integer)
@@ -48,4 +56,40 @@ class Question(Base):
     created_date = Column(DateTime, default=datetime.utcnow)
     
     textbook = relationship("Textbook")
-    chapter = relationship("Chapter", back_populates="questions")
\ No newline at end of file
+    chapter = relationship("Chapter", back_populates="questions")
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    textbook_id = Column(Integer, ForeignKey("textbooks.id"), index=True)
+    kind = Column(String, default="extract")  # extract, reextract
+    status = Column(String, default="pending", index=True)  # pending, running, completed, failed, cancelled
+    file_path = Column(String)  # Uploaded PDF the job reads
+    page_count = Column(Integer, nullable=True)  # Job size for shortest-job-first ordering
+    profile = Column(Boolean, default=False)  # Run the job under cProfile
+    last_committed_page = Column(Integer, default=0)  # Checkpoint: pages up to here are fully stored
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)  # Failed jobs are retried until attempts reach this
+    next_attempt_date = Column(DateTime, nullable=True)  # Earliest time a retry may be claimed
+    worker_id = Column(String, nullable=True)  # Worker process running the job
+    heartbeat_date = Column(DateTime, nullable=True)  # Last sign of life from that worker
+    cancel_requested = Column(Boolean, default=False)  # Stop the running job at its next chunk
+    retry_skipped = Column(Boolean, default=False)  # Extract pages cached as timed out again
+    budget_start_seconds = Column(Float, default=0.0)  # Textbook processing_seconds when the job was queued; its time budget counts from here
+    error = Column(Text, nullable=True)
+    created_date = Column(DateTime, default=datetime.utcnow)
+    updated_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    textbook = relationship("Textbook")
+
+class PageText(Base):
+    __tablename__ = "page_texts"
+    __table_args__ = (UniqueConstraint("content_hash", "page_number"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String, index=True)  # SHA-256 of the source PDF
+    page_number = Column(Integer)
+    text = Column(LargeBinary)  # zlib-compressed UTF-8 text, empty for blank pages
+    bbox = Column(String, nullable=True)  # JSON-encoded page bounding box
+    skipped_seconds = Column(Float, nullable=True)  # Set if extraction timed out after this long; cached as blank
\ No newline at end of file
@@ -0,0 +1,139 @@
+import hashlib
+import re
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+NUM_PERM = 32  # 16-bit min-hashes per signature, all taken from one blake2b digest per shingle
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5  # Characters per shingle
+DEFAULT_THRESHOLD = 0.8  # Estimated Jaccard similarity at which a question is a duplicate
+DEFAULT_CAPACITY = 50000  # Signatures kept per index; the oldest are evicted beyond this
+BUCKET_SIZE = 8  # Most recent ids kept per band bucket; each is a candidate when the band matches
+
+_DIGEST_FORMAT = f'<{NUM_PERM}H'
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+_LEADING_NUMBER_RE = re.compile(r'^\s*(?:q(?:uestion)?\s*)?\d+(?:\.\d+)*\s*[\.\):]?\s*', re.IGNORECASE)
+_NUMBER_RE = re.compile(r'\d+')
+
+class NearDuplicateIndex:
+    """
+    Streaming near-duplicate detector for question text using MinHash + LSH.
+
+    Each question is reduced to a MinHash signature over character shingles
+    and bucketed by LSH bands, so a check only compares against questions
+    that share a band instead of every question seen. Each band bucket keeps
+    its BUCKET_SIZE most recent questions, so a question sharing a band with
+    several earlier ones is compared with all of them. Numbers inside the
+    question must match exactly, so templated questions that differ only in
+    their values are kept. Memory is bounded by capacity: beyond it the
+    oldest signatures are evicted.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, capacity: int = DEFAULT_CAPACITY):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.suppressed = 0
+        self._next_id = 0
+        self._entries = OrderedDict()  # id -> (signature bytes, numbers fingerprint, band keys)
+        self._buckets = [dict() for _ in range(BANDS)]  # band key -> ids, oldest first
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, text: str):
+        """
+        Index a question without checking it, e.g. when seeding from stored rows
+        """
+        signature, numbers = _fingerprint(text)
+        if signature is not None:
+            self._insert(signature, numbers)
+
+    def add_many(self, texts: Iterable[str]):
+        for text in texts:
+            self.add(text)
+
+    def is_duplicate(self, text: str) -> bool:
+        """
+        Check a question against everything indexed so far, indexing it if new
+        """
+        signature, numbers = _fingerprint(text)
+        if signature is None:
+            return False
+
+        band_keys = _band_keys(signature)
+        checked = set()
+        for band, band_key in enumerate(band_keys):
+            for candidate_id in self._buckets[band].get(band_key, ()):
+                if candidate_id in checked:
+                    continue
+                checked.add(candidate_id)
+                candidate_signature, candidate_numbers, _ = self._entries[candidate_id]
+                if candidate_numbers == numbers and _similarity(signature, candidate_signature) >= self.threshold:
+                    self.suppressed += 1
+                    return True
+
+        self._insert(signature, numbers, band_keys)
+        return False
+
+    def _insert(self, signature: bytes, numbers: int, band_keys: Optional[List[bytes]] = None):
+        band_keys = band_keys or _band_keys(signature)
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._entries[entry_id] = (signature, numbers, band_keys)
+        for band, band_key in enumerate(band_keys):
+            bucket = self._buckets[band].setdefault(band_key, [])
+            bucket.append(entry_id)
+            if len(bucket) > BUCKET_SIZE:
+                del bucket[0]
+
+        if len(self._entries) > self.capacity:
+            # The evicted entry is the oldest, so it can only be first in its buckets
+            evicted_id, (_, _, evicted_keys) = self._entries.popitem(last=False)
+            for band, band_key in enumerate(evicted_keys):
+                bucket = self._buckets[band].get(band_key)
+                if bucket and bucket[0] == evicted_id:
+                    if len(bucket) == 1:
+                        del self._buckets[band][band_key]
+                    else:
+                        del bucket[0]
+
+def _fingerprint(text: str):
+    """
+    MinHash signature of the normalised text and a hash of the numbers in it
+    """
+    body = _LEADING_NUMBER_RE.sub('', text.lower())
+    normalized = _NON_WORD_RE.sub(' ', body).strip()
+    if not normalized:
+        return None, 0
+
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+    # One 64-byte digest per shingle yields all NUM_PERM hash values at once;
+    # the signature is their column-wise minimum
+    hashed = [
+        struct.unpack(_DIGEST_FORMAT, hashlib.blake2b(shingle.encode('utf-8'), digest_size=2 * NUM_PERM).digest())
+        for shingle in shingles
+    ]
+    signature = struct.pack(_DIGEST_FORMAT, *map(min, zip(*hashed)))
+
+    numbers = zlib.crc32(' '.join(_NUMBER_RE.findall(body)).encode('ascii'))
+    return signature, numbers
+
+def _band_keys(signature: bytes) -> List[bytes]:
+    band_width = 2 * ROWS
+    return [signature[band * band_width:(band + 1) * band_width] for band in range(BANDS)]
+
+def _similarity(left: bytes, right: bytes) -> float:
+    """
+    Estimated Jaccard similarity: the fraction of matching min-hashes
+    """
+    left_values = struct.unpack(_DIGEST_FORMAT, left)
+    right_values = struct.unpack(_DIGEST_FORMAT, right)
+    return sum(map(int.__eq__, left_values, right_values)) / NUM_PERM
@@ -0,0 +1,209 @@
+import json
+import logging
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from .models import PageText, Textbook
+from .page_source import PDFPageSource
+
+logger = logging.getLogger(__name__)
+
+CACHE_WRITE_BATCH = 50  # Pages written to the cache per commit
+
+class CachedPageSource:
+    """
+    Page source that serves extracted text from the page_texts table.
+
+    Pages are keyed by the PDF's content hash, so any textbook with the same
+    bytes reuses them. Cached pages never open the PDF; only the pages missing
+    from the cache are read from the wrapped source and written back as they
+    stream. Pages whose extraction timed out are cached as skipped, and are
+    only extracted again when retry_skipped is set.
+    """
+
+    def __init__(self, db: Session, content_hash: str, source: PDFPageSource, retry_skipped: bool = False):
+        self.db = db
+        self.content_hash = content_hash
+        self.source = source
+        self.retry_skipped = retry_skipped
+        self._cached_skipped: List[Tuple[int, float]] = []  # Skipped pages served from the cache
+
+    def __enter__(self) -> "CachedPageSource":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.source.close()
+
+    @property
+    def skipped_pages(self) -> List[Tuple[int, float]]:
+        """
+        Timed-out pages of this run as (page number, seconds), whether they
+        timed out now or on an earlier extraction of the same bytes
+        """
+        return sorted(self._cached_skipped + self.source.skipped_pages)
+
+    @property
+    def total_pages(self) -> int:
+        known_total = self._known_total_pages()
+        if known_total is not None:
+            return known_total
+        return self.source.total_pages
+
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield extracted text for pages in [start_page, end_page), skipping empty pages
+        """
+        end_page = self.total_pages if end_page is None else min(end_page, self.total_pages)
+        cached_pages = self._cached_pages(start_page, end_page)
+        usable = {
+            page_number for page_number, skipped_seconds in cached_pages.items()
+            if skipped_seconds is None or not self.retry_skipped
+        }
+        missing = [page_number for page_number in range(start_page + 1, end_page + 1) if page_number not in usable]
+
+        if not missing:
+            yield from self._read_cached(start_page, end_page)
+            return
+
+        logger.info(
+            f"Page cache miss for {len(missing)} of {end_page - start_page} pages "
+            f"in {start_page + 1}-{end_page}, extracting them from PDF"
+        )
+        position = start_page
+        for run_start, run_end in _runs(missing):
+            if run_start > position:
+                yield from self._read_cached(position, run_start)
+            yield from self._extract(run_start, run_end, set(cached_pages))
+            position = run_end
+        if position < end_page:
+            yield from self._read_cached(position, end_page)
+
+    def _extract(self, start_page: int, end_page: int, cached_pages: set) -> Iterator[Dict]:
+        """
+        Extract pages in [start_page, end_page) from the source and cache them,
+        replacing cache rows of pages that are extracted again
+        """
+        pending = []
+        next_page = start_page + 1
+
+        for page_data in self.source.iter_pages(start_page, end_page):
+            # Pages the source did not yield were blank or timed out
+            pending.extend(self._gap_rows(next_page, page_data['page_number']))
+            pending.append(self._to_row(page_data['page_number'], page_data['text'], page_data['bbox']))
+            next_page = page_data['page_number'] + 1
+
+            if len(pending) >= CACHE_WRITE_BATCH:
+                self._write(pending, cached_pages)
+                pending = []
+
+            yield page_data
+
+        pending.extend(self._gap_rows(next_page, end_page + 1))
+        self._write(pending, cached_pages)
+
+    def _gap_rows(self, start_page: int, end_page: int) -> List[PageText]:
+        """
+        Cache rows for pages in [start_page, end_page) that the source skipped:
+        marked as skipped if they timed out, otherwise blank
+        """
+        timed_out = dict(self.source.skipped_pages)
+        return [
+            self._to_row(page_number, '', None, timed_out.get(page_number))
+            for page_number in range(start_page, end_page)
+        ]
+
+    def _known_total_pages(self) -> Optional[int]:
+        """
+        Page count of a textbook with these bytes, if its pages are all cached
+        """
+        total_pages = self.db.query(Textbook.total_pages).filter(
+            Textbook.content_hash == self.content_hash,
+            Textbook.total_pages.isnot(None)
+        ).limit(1).scalar()
+        if total_pages is None:
+            return None
+
+        cached_count = self.db.query(PageText).filter(
+            PageText.content_hash == self.content_hash
+        ).count()
+        return total_pages if cached_count >= total_pages else None
+
+    def _cached_pages(self, start_page: int, end_page: int) -> Dict[int, Optional[float]]:
+        """
+        Cached page numbers in (start_page, end_page], mapped to the seconds
+        spent before timing out for pages cached as skipped, else None
+        """
+        rows = self.db.query(PageText.page_number, PageText.skipped_seconds).filter(
+            PageText.content_hash == self.content_hash,
+            PageText.page_number > start_page,
+            PageText.page_number <= end_page
+        ).all()
+        return {row.page_number: row.skipped_seconds for row in rows}
+
+    def _read_cached(self, start_page: int, end_page: int) -> Iterator[Dict]:
+        # Read in fixed batches rather than holding a cursor open, since callers
+        # commit on the same session between pages
+        for batch_start in range(start_page, end_page, CACHE_WRITE_BATCH):
+            batch_end = min(batch_start + CACHE_WRITE_BATCH, end_page)
+            rows = self.db.query(
+                PageText.page_number, PageText.text, PageText.bbox, PageText.skipped_seconds
+            ).filter(
+                PageText.content_hash == self.content_hash,
+                PageText.page_number > batch_start,
+                PageText.page_number <= batch_end
+            ).order_by(PageText.page_number).all()
+
+            for row in rows:
+                if row.skipped_seconds is not None:
+                    self._cached_skipped.append((row.page_number, row.skipped_seconds))
+                    continue
+                text = zlib.decompress(row.text).decode('utf-8')
+                if not text:
+                    continue
+                yield {
+                    'page_number': row.page_number,
+                    'text': text,
+                    'bbox': tuple(json.loads(row.bbox)) if row.bbox else None
+                }
+
+    def _to_row(self, page_number: int, text: str, bbox, skipped_seconds: Optional[float] = None) -> PageText:
+        return PageText(
+            content_hash=self.content_hash,
+            page_number=page_number,
+            text=zlib.compress(text.encode('utf-8')),
+            bbox=json.dumps(list(bbox)) if bbox else None,
+            skipped_seconds=skipped_seconds
+        )
+
+    def _write(self, rows: List[PageText], cached_pages: set):
+        if not rows:
+            return
+        try:
+            # Pages extracted again (skipped ones being retried) replace their old rows
+            replaced = [row.page_number for row in rows if row.page_number in cached_pages]
+            if replaced:
+                self.db.query(PageText).filter(
+                    PageText.content_hash == self.content_hash,
+                    PageText.page_number.in_(replaced)
+                ).delete(synchronize_session=False)
+            self.db.add_all(rows)
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Error caching page text: {str(e)}")
+            self.db.rollback()
+
+def _runs(page_numbers: List[int]) -> List[Tuple[int, int]]:
+    """
+    Group sorted 1-based page numbers into consecutive runs, as
+    (start_page, end_page) ranges in iter_pages' 0-based, end-exclusive form
+    """
+    runs = []
+    for page_number in page_numbers:
+        if runs and runs[-1][1] == page_number - 1:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number - 1, page_number])
+    return [tuple(run) for run in runs]
@@ -0,0 +1,246 @@
+import gc
+import os
+import signal
+import threading
+import time
+import pdfplumber
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from .memory import MemoryMonitor
+from .metrics import PAGES_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+LOW_MEMORY_GC_INTERVAL = 25  # Pages between forced garbage collections in low-memory mode
+PAGE_TIMEOUT = float(os.environ.get("PDF_PAGE_TIMEOUT", 30))  # Seconds allowed per page; 0 disables
+
+class PageTimeout(BaseException):
+    """
+    Raised inside a page's text extraction when it overruns its time limit.
+
+    A BaseException so that broad `except Exception` handlers inside the PDF
+    parser cannot swallow it.
+    """
+
+@contextmanager
+def time_limit(seconds: float):
+    """
+    Raise PageTimeout in this thread if the block runs longer than seconds.
+
+    Uses SIGALRM, so it only applies in the main thread of a process on
+    platforms with setitimer (job workers and extraction workers both run
+    pages there); elsewhere the block runs unbounded.
+    """
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def handle_alarm(signum, frame):
+        raise PageTimeout()
+
+    previous_handler = signal.signal(signal.SIGALRM, handle_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+class PDFPageSource:
+    """
+    Opens a PDF once and streams extracted page text as a generator.
+
+    In low-memory mode the document-level object and font caches are dropped
+    after every page as well, trading some re-parsing for flat memory use.
+    An optional MemoryMonitor is sampled after each page. Pages whose
+    extraction exceeds page_timeout seconds are skipped and recorded in
+    skipped_pages as (page number, seconds spent).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        low_memory: bool = False,
+        memory_monitor: Optional[MemoryMonitor] = None,
+        page_timeout: float = PAGE_TIMEOUT
+    ):
+        self.file_path = file_path
+        self.low_memory = low_memory
+        self.memory_monitor = memory_monitor
+        self.page_timeout = page_timeout
+        self.skipped_pages: List[Tuple[int, float]] = []
+        self._pdf = None
+
+    def __enter__(self) -> "PDFPageSource":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.file_path)
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    @property
+    def total_pages(self) -> int:
+        self.open()
+        return len(self._pdf.pages)
+
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield extracted text for pages in [start_page, end_page), skipping empty pages
+        """
+        self.open()
+        total_pages = len(self._pdf.pages)
+        end_page = total_pages if end_page is None else min(end_page, total_pages)
+
+        for page_num in range(start_page, end_page):
+            page = self._pdf.pages[page_num]
+            started = time.perf_counter()
+            try:
+                with time_limit(self.page_timeout):
+                    page_data = extract_page(page, page_num)
+            except PageTimeout:
+                elapsed = time.perf_counter() - started
+                logger.warning(f"Skipping page {page_num + 1} of {self.file_path}: extraction took over {elapsed:.1f}s")
+                self.skipped_pages.append((page_num + 1, elapsed))
+                PAGES_SKIPPED.inc()
+                # The parser may have been interrupted mid-object, so start from a clean document
+                self._pdf.close()
+                self._pdf = pdfplumber.open(self.file_path)
+                continue
+
+            # Drop the parsed layout objects so memory stays flat across the document
+            page.close()
+            if self.low_memory:
+                self._release_document_caches(page_num)
+            if self.memory_monitor is not None:
+                self.memory_monitor.check()
+
+            if page_data:
+                yield page_data
+
+    def _release_document_caches(self, page_num: int):
+        """
+        Drop pdfminer's decoded-object and font caches, which otherwise grow
+        with every page touched (decoded image streams in particular)
+        """
+        cached_objects = getattr(self._pdf.doc, '_cached_objs', None)
+        if cached_objects is not None:
+            cached_objects.clear()
+        cached_fonts = getattr(self._pdf.rsrcmgr, '_cached_fonts', None)
+        if cached_fonts is not None:
+            cached_fonts.clear()
+        if (page_num + 1) % LOW_MEMORY_GC_INTERVAL == 0:
+            gc.collect()
+
+class ParallelPageSource(PDFPageSource):
+    """
+    Page source that shards page ranges across a process pool.
+
+    Each worker opens the file itself and returns its shard's pages in order;
+    shards are yielded in document order as soon as each one completes, so
+    downstream stages consume results while later shards are still parsing.
+    Documents shorter than min_pages are extracted serially in this process.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        workers: int,
+        shard_size: int,
+        min_pages: int = 0,
+        low_memory: bool = False,
+        memory_monitor: Optional[MemoryMonitor] = None,
+        page_timeout: float = PAGE_TIMEOUT
+    ):
+        super().__init__(file_path, low_memory, memory_monitor, page_timeout)
+        self.workers = max(1, workers)
+        self.shard_size = max(1, shard_size)
+        self.min_pages = min_pages
+        self._executor = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        super().close()
+
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Dict]:
+        end_page = self.total_pages if end_page is None else min(end_page, self.total_pages)
+
+        if self.workers < 2 or self.total_pages < self.min_pages or end_page - start_page < 2:
+            yield from super().iter_pages(start_page, end_page)
+            return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        shards = iter(range(start_page, end_page, self.shard_size))
+        pending = deque()
+
+        # Keep a bounded window of shards in flight so finished text never piles up
+        for shard_start in shards:
+            pending.append(self._submit(shard_start, end_page))
+            if len(pending) >= self.workers * 2:
+                break
+
+        while pending:
+            shard_pages, worker_rss, shard_skipped = pending.popleft().result()
+            if self.memory_monitor is not None:
+                self.memory_monitor.observe(worker_rss)
+            self.skipped_pages.extend(shard_skipped)
+            PAGES_SKIPPED.inc(len(shard_skipped))
+            next_start = next(shards, None)
+            if next_start is not None:
+                pending.append(self._submit(next_start, end_page))
+            yield from shard_pages
+
+    def _submit(self, shard_start: int, end_page: int):
+        shard_end = min(shard_start + self.shard_size, end_page)
+        limit_bytes = self.memory_monitor.limit_bytes if self.memory_monitor is not None else None
+        return self._executor.submit(
+            _extract_page_range, self.file_path, shard_start, shard_end, self.low_memory, limit_bytes,
+            self.page_timeout
+        )
+
+def _extract_page_range(
+    file_path: str,
+    start_page: int,
+    end_page: int,
+    low_memory: bool = False,
+    limit_bytes: Optional[int] = None,
+    page_timeout: float = PAGE_TIMEOUT
+) -> Tuple[List[Dict], int, List[Tuple[int, float]]]:
+    """
+    Process pool entry point: open the PDF in the worker and extract one shard.
+    Returns the shard's pages, the worker's peak RSS while extracting it and
+    the pages skipped for timing out.
+    """
+    monitor = MemoryMonitor(limit_bytes)
+    with PDFPageSource(file_path, low_memory, monitor, page_timeout) as source:
+        pages = list(source.iter_pages(start_page, end_page))
+    return pages, monitor.peak_bytes, source.skipped_pages
+
+def extract_page(page, page_num: int) -> Optional[Dict]:
+    """
+    Extract the text of a single pdfplumber page in the shape used by the extractor
+    """
+    text = page.extract_text()
+    if not text:
+        return None
+
+    return {
+        'page_number': page_num + 1,
+        'text': text.strip(),
+        'bbox': page.bbox if hasattr(page, 'bbox') else None
+    }
@@ -1,92 +1,481 @@
-import PyPDF2
-import pdfplumber
+import itertools
+import json
+import os
 import re
-from typing import List, Dict, Tuple, Optional
+import time
+import PyPDF2
+from collections import defaultdict
+from typing import Iterable, Iterator, List, Dict, Tuple, Optional
 import logging
+from sqlalchemy import delete, or_
 from sqlalchemy.orm import Session
-from .models import Textbook, Chapter
-from .question_extractor import QuestionExtractor
+from sqlalchemy.orm.attributes import set_committed_value
+from .db_writer import has_write_channel, submit_write
+from .memory import MemoryMonitor
+from .metrics import PIPELINE_STAGE_SECONDS, timed_iter
+from .models import Textbook, Chapter, ProcessingJob, Question
+from .page_cache import CachedPageSource
+from .page_source import PDFPageSource, ParallelPageSource, PAGE_TIMEOUT
+from .progress import ProgressTracker
+from .question_extractor import QuestionExtractor, EXTRACTOR_VERSION
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 10  # Pages handed to the question extractor at a time
+TOC_SCAN_PAGES = 20  # Pages searched for a formal table of contents
+HEADING_SCAN_PAGES = 50  # Pages searched for chapter headings when no TOC is found
+DELETE_BATCH_SIZE = 500  # Question ids per DELETE statement during re-extraction
+
+# Question columns compared when diffing re-extracted questions against stored ones
+QUESTION_DIFF_COLUMNS = ('chapter_id', 'page_number', 'question_text', 'question_type', 'context', 'answer')
+
+# Parallel extraction settings; a single worker keeps extraction in-process
+EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_SHARD_SIZE = int(os.environ.get("PDF_EXTRACT_SHARD_SIZE", 25))
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 100))
+
+# Bounded-memory settings; a limit of 0 disables the ceiling
+LOW_MEMORY = os.environ.get("PDF_LOW_MEMORY", "").lower() in ("1", "true", "yes")
+MEMORY_LIMIT_MB = int(os.environ.get("PDF_MEMORY_LIMIT_MB", 0))
+
+# Wall-clock seconds processing a textbook may take across its resumed attempts; 0 disables the budget
+JOB_TIME_BUDGET = float(os.environ.get("PDF_JOB_TIME_BUDGET", 3600))
+
+class JobCancelled(Exception):
+    """
+    Raised between chunks when cancellation of the running job was requested
+    """
+
+class TimeBudgetExceeded(Exception):
+    """
+    Raised between chunks when a job has used up its time budget
+    """
+
 class PDFProcessor:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        workers: int = EXTRACT_WORKERS,
+        shard_size: int = EXTRACT_SHARD_SIZE,
+        parallel_min_pages: int = PARALLEL_MIN_PAGES,
+        low_memory: bool = LOW_MEMORY,
+        memory_limit_mb: int = MEMORY_LIMIT_MB,
+        page_timeout: float = PAGE_TIMEOUT,
+        time_budget: float = JOB_TIME_BUDGET,
+        retry_skipped: bool = False
+    ):
         self.db = db
         self.question_extractor = QuestionExtractor(db)
+        self.workers = workers
+        self.shard_size = shard_size
+        self.parallel_min_pages = parallel_min_pages
+        self.low_memory = low_memory
+        self.memory_limit_mb = memory_limit_mb
+        self.page_timeout = page_timeout
+        self.time_budget = time_budget
+        self.retry_skipped = retry_skipped  # Extract pages cached as timed out again instead of skipping them
+        self._duplicates_base = 0
+        self._seconds_base = 0.0
+        self._budget_base = 0.0
+        self._skipped_base = []
+        self._started = None
+        self._source = None
         
     def process_pdf(self, file_path: str, textbook_id: int) -> bool:
         """
-        Process a PDF file iteratively to extract structure and questions
+        Process a PDF file in a single streaming pass to extract structure and questions.
+        
+        Questions are committed in batches together with a checkpoint on the
+        textbook's ProcessingJob, so an interrupted job resumes after the last
+        committed page. Peak RSS over the job is recorded on the textbook.
+        Time spent in each stage is recorded in PIPELINE_STAGE_SECONDS.
+        
+        Pages whose extraction times out are skipped and recorded on the
+        textbook. Between chunks the job stops if it was cancelled or has
+        used up its time budget.
         """
+        job = None
+        monitor = MemoryMonitor(self.memory_limit_mb * 1024 * 1024)
+        self._started = time.monotonic()
+        self._source = None
         try:
             # Update status to processing
             textbook = self.db.query(Textbook).filter(Textbook.id == textbook_id).first()
             textbook.processing_status = "processing"
+            job = self._get_job(textbook_id)
+            job.status = "running"
+            job.attempts = (job.attempts or 0) + 1
+            job.error = None
             self.db.commit()
             
-            # Get PDF metadata
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                
-            textbook.total_pages = total_pages
-            self.db.commit()
-            
-            # Extract table of contents
-            toc = self._extract_table_of_contents(file_path)
-            if toc:
-                self._store_chapters(toc, textbook_id)
+            resume_page = job.last_committed_page or 0
+            if resume_page:
+                logger.info(f"Resuming textbook {textbook_id} after page {resume_page}")
             
-            # Process PDF in chunks to avoid memory issues
-            chunk_size = 10  # Process 10 pages at a time
+            # Near-duplicates and skipped pages of earlier attempts of a resumed job still count;
+            # time counts for every earlier attempt, including ones that failed before a checkpoint
+            self._duplicates_base = (textbook.duplicates_suppressed or 0) if resume_page else 0
+            self._seconds_base = textbook.processing_seconds or 0.0
+            # ...and against the time budget, except time spent before a manual retry
+            self._budget_base = max(0.0, self._seconds_base - (job.budget_start_seconds or 0.0))
+            self._skipped_base = [
+                entry for entry in json.loads(textbook.skipped_pages or "[]")
+                if entry['page'] <= resume_page
+            ]
             
-            for start_page in range(0, total_pages, chunk_size):
-                end_page = min(start_page + chunk_size, total_pages)
-                logger.info(f"Processing pages {start_page + 1} to {end_page}")
+            # Open the PDF once; every stage below reads from this page source
+            with self._open_page_source(file_path, textbook.content_hash, monitor) as source:
+                self._source = source
+                with PIPELINE_STAGE_SECONDS.time("open"):
+                    total_pages = source.total_pages
+                
+                textbook.total_pages = total_pages
+                self.db.commit()
                 
-                chunk_text = self._extract_text_chunk(file_path, start_page, end_page)
+                stored_questions = self.db.query(Question.id).filter(
+                    Question.textbook_id == textbook_id
+                ).count() if resume_page else 0
+                progress = ProgressTracker(textbook_id, job.id, total_pages, resume_page, stored_questions)
+                progress.start()
                 
-                # Extract questions from this chunk
-                self.question_extractor.extract_questions_from_text(
-                    chunk_text, textbook_id, start_page + 1
-                )
+                has_chapters = self.db.query(Chapter.id).filter(
+                    Chapter.textbook_id == textbook_id
+                ).first() is not None
+                
+                # Prefer the PDF's bookmarks, which need no page text at all
+                with PIPELINE_STAGE_SECONDS.time("toc"):
+                    outline = [] if has_chapters else self._extract_outline(file_path)
+                    if outline:
+                        self._store_chapters(outline, textbook_id, total_pages)
+                
+                if has_chapters or outline:
+                    pages = timed_iter(source.iter_pages(resume_page, total_pages), "text_extraction")
+                else:
+                    # Buffer the leading pages so TOC detection and heading inference
+                    # can run before any question is assigned to a chapter
+                    head_pages = list(timed_iter(source.iter_pages(0, HEADING_SCAN_PAGES), "text_extraction"))
+                    
+                    with PIPELINE_STAGE_SECONDS.time("toc"):
+                        toc = self._extract_table_of_contents(head_pages)
+                        if toc:
+                            self._store_chapters(toc, textbook_id, total_pages)
+                    
+                    pages = itertools.chain(
+                        (page for page in head_pages if page['page_number'] > resume_page),
+                        timed_iter(source.iter_pages(max(HEADING_SCAN_PAGES, resume_page), total_pages), "text_extraction")
+                    )
+                
+                for chunk in _chunked(pages, CHUNK_SIZE):
+                    logger.info(f"Processing pages {chunk[0]['page_number']} to {chunk[-1]['page_number']}")
+                    
+                    # Insert this chunk's questions in bulk and commit them together
+                    # with the checkpoint, so a crash never loses more than one chunk
+                    questions_found = self.question_extractor.extract_questions_from_text(
+                        chunk, textbook_id, chunk[0]['page_number'], commit=False
+                    )
+                    self._commit_checkpoint(job, textbook, chunk[-1]['page_number'], monitor)
+                    
+                    # Also sample between chunks, which covers pages served from the cache;
+                    # a cancelled or timed-out job keeps this chunk and a retry resumes after it
+                    monitor.check()
+                    self._check_job_limits(job)
+                    
+                    progress.advance(chunk[-1]['page_number'], questions_found)
+                
+                if progress.pages_processed < total_pages:
+                    # Trailing blank pages yield no chunk
+                    progress.advance(total_pages, 0)
                 
             # Update status to completed
-            textbook.processing_status = "completed"
-            self.db.commit()
+            with PIPELINE_STAGE_SECONDS.time("db_write"):
+                self._write_checkpoint(
+                    job,
+                    textbook,
+                    {'last_committed_page': total_pages, 'status': "completed"},
+                    {
+                        'processing_status': "completed",
+                        'peak_rss_bytes': monitor.peak_bytes,
+                        'duplicates_suppressed': self._duplicates_suppressed(textbook_id),
+                        'extractor_version': EXTRACTOR_VERSION,
+                        **self._time_values()
+                    }
+                )
+            logger.info(
+                f"Suppressed {textbook.duplicates_suppressed} near-duplicate questions "
+                f"in textbook {textbook_id}"
+            )
             
             return True
             
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
+            self.db.rollback()
+            self.question_extractor.writer.discard()
             textbook = self.db.query(Textbook).filter(Textbook.id == textbook_id).first()
             if textbook:
-                textbook.processing_status = "failed"
+                cancelled = isinstance(e, JobCancelled)
+                textbook.processing_status = "cancelled" if cancelled else "failed"
+                textbook.peak_rss_bytes = monitor.peak_bytes or None
+                for name, value in self._time_values().items():
+                    setattr(textbook, name, value)
+                if job is not None:
+                    job.status = "cancelled" if cancelled else "failed"
+                    job.error = str(e)
+                    if isinstance(e, TimeBudgetExceeded):
+                        # Retrying would only run into the budget again; a manual retry grants a new one
+                        job.max_attempts = job.attempts
                 self.db.commit()
             return False
     
+    def reextract_questions(self, file_path: str, textbook_id: int, job: Optional[ProcessingJob] = None) -> Optional[Dict]:
+        """
+        Re-run only the question stage of a processed textbook with the current
+        extractor rules.
+        
+        Page text comes from the page cache (the PDF is only opened for pages
+        missing from it) and chapters are kept. The new questions are diffed
+        against the stored rows, and only the differences are written: stale
+        rows are deleted and new ones inserted, so unchanged questions keep
+        their ids. Progress is recorded on job, a new reextract job unless one
+        is given. Returns the counts, or None if the job failed or was cancelled.
+        """
+        self._started = time.monotonic()
+        if job is None:
+            job = ProcessingJob(textbook_id=textbook_id, kind="reextract", attempts=0)
+            self.db.add(job)
+        job.status = "running"
+        job.attempts = (job.attempts or 0) + 1
+        job.error = None
+        self.db.commit()
+        
+        try:
+            textbook = self.db.query(Textbook).filter(Textbook.id == textbook_id).first()
+            stored = self._stored_question_ids(textbook_id)
+            extractor = self.question_extractor
+            extractor.reset_duplicates(textbook_id)
+            extractor.invalidate_chapters(textbook_id)
+            
+            inserted = unchanged = 0
+            with self._open_page_source(file_path, textbook.content_hash) as source:
+                pages = source.iter_pages(0, source.total_pages)
+                
+                for chunk in _chunked(pages, CHUNK_SIZE):
+                    self._check_job_limits(job)
+                    for row in extractor.question_rows(chunk, textbook_id):
+                        matching_ids = stored.get(_question_key(row))
+                        if matching_ids:
+                            matching_ids.pop()
+                            unchanged += 1
+                        else:
+                            extractor.writer.add(row)
+                            inserted += 1
+            
+            # Whatever was not matched is no longer produced by the extractor
+            stale_ids = [question_id for ids in stored.values() for question_id in ids]
+            for start in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+                self.db.execute(
+                    delete(Question).where(Question.id.in_(stale_ids[start:start + DELETE_BATCH_SIZE]))
+                )
+            extractor.writer.flush()
+            
+            textbook.extractor_version = EXTRACTOR_VERSION
+            textbook.duplicates_suppressed = extractor.duplicates_suppressed(textbook_id)
+            job.status = "completed"
+            job.last_committed_page = textbook.total_pages
+            self.db.commit()
+            
+            counts = {'inserted': inserted, 'deleted': len(stale_ids), 'unchanged': unchanged}
+            logger.info(f"Re-extracted textbook {textbook_id} with extractor v{EXTRACTOR_VERSION}: {counts}")
+            return counts
+            
+        except Exception as e:
+            logger.error(f"Error re-extracting questions: {str(e)}")
+            self.db.rollback()
+            self.question_extractor.writer.discard()
+            job.status = "cancelled" if isinstance(e, JobCancelled) else "failed"
+            job.error = str(e)
+            if isinstance(e, TimeBudgetExceeded):
+                job.max_attempts = job.attempts
+            self.db.commit()
+            return None
+    
+    def _stored_question_ids(self, textbook_id: int) -> Dict[tuple, List[int]]:
+        """
+        Map each stored question's diff key to the ids of the rows carrying it
+        """
+        columns = [getattr(Question, name) for name in QUESTION_DIFF_COLUMNS]
+        rows = self.db.query(Question.id, *columns).filter(Question.textbook_id == textbook_id).all()
+        
+        stored = defaultdict(list)
+        for row in rows:
+            stored[_question_key(row._mapping)].append(row.id)
+        return stored
+    
+    def _commit_checkpoint(self, job: ProcessingJob, textbook: Textbook, page_number: int, monitor: MemoryMonitor):
+        """
+        Insert buffered questions and advance the checkpoint in one transaction
+        """
+        with PIPELINE_STAGE_SECONDS.time("db_write"):
+            inserted = self._write_checkpoint(
+                job,
+                textbook,
+                {'last_committed_page': page_number},
+                {
+                    'peak_rss_bytes': monitor.peak_bytes,
+                    'duplicates_suppressed': self._duplicates_suppressed(textbook.id),
+                    **self._time_values()
+                }
+            )
+        logger.info(f"Committed {inserted} questions through page {page_number}")
+    
+    def _write_checkpoint(self, job: ProcessingJob, textbook: Textbook, job_values: Dict, textbook_values: Dict) -> int:
+        """
+        Insert buffered questions and apply the job and textbook values in one
+        transaction. In job workers the write goes through the web process's
+        database writer, which groups it with other jobs' writes; the session's
+        objects are then only brought up to date, not written again.
+        """
+        writer = self.question_extractor.writer
+        
+        if has_write_channel():
+            rows = writer.take()
+            submit_write(rows, job.id, job_values, textbook.id, textbook_values)
+            for instance, values in ((job, job_values), (textbook, textbook_values)):
+                for name, value in values.items():
+                    set_committed_value(instance, name, value)
+            return len(rows)
+        
+        inserted = writer.flush()
+        for instance, values in ((job, job_values), (textbook, textbook_values)):
+            for name, value in values.items():
+                setattr(instance, name, value)
+        self.db.commit()
+        return inserted
+    
+    def _time_values(self) -> Dict:
+        """
+        Time spent on the textbook so far and the pages skipped for timing out,
+        as textbook column values
+        """
+        skipped = list(self._skipped_base)
+        if self._source is not None:
+            skipped += [
+                {'page': page_number, 'seconds': round(seconds, 3)}
+                for page_number, seconds in self._source.skipped_pages
+            ]
+        return {
+            'processing_seconds': self._seconds_base + (time.monotonic() - self._started),
+            'skipped_pages': json.dumps(skipped),
+            'skipped_page_seconds': sum(entry['seconds'] for entry in skipped)
+        }
+    
+    def _check_job_limits(self, job: ProcessingJob):
+        """
+        Raise if the job was cancelled or the textbook has run past its time
+        budget, counting earlier attempts the job resumed from
+        """
+        cancel_requested = self.db.query(ProcessingJob.cancel_requested).filter(
+            ProcessingJob.id == job.id
+        ).scalar()
+        if cancel_requested:
+            raise JobCancelled("Cancelled by request")
+        
+        spent = self._budget_base + (time.monotonic() - self._started)
+        if self.time_budget and spent > self.time_budget:
+            raise TimeBudgetExceeded(f"Time budget of {self.time_budget:g}s exceeded")
+    
+    def _duplicates_suppressed(self, textbook_id: int) -> int:
+        return self._duplicates_base + self.question_extractor.duplicates_suppressed(textbook_id)
+    
+    def _get_job(self, textbook_id: int) -> ProcessingJob:
+        """
+        Return the textbook's processing job, creating it on first run
+        """
+        job = self.db.query(ProcessingJob).filter(
+            ProcessingJob.textbook_id == textbook_id,
+            or_(ProcessingJob.kind.is_(None), ProcessingJob.kind == "extract")
+        ).order_by(ProcessingJob.id.desc()).first()
+        
+        if job is None:
+            job = ProcessingJob(textbook_id=textbook_id, status="pending", last_committed_page=0, attempts=0)
+            self.db.add(job)
+            self.db.flush()
+        
+        return job
+    
+    def _open_page_source(
+        self,
+        file_path: str,
+        content_hash: Optional[str] = None,
+        memory_monitor: Optional[MemoryMonitor] = None
+    ):
+        """
+        Pick the serial or process-pool page source for this processor's settings,
+        reading through the extracted-text cache when the file hash is known
+        """
+        if self.workers > 1:
+            source = ParallelPageSource(
+                file_path, self.workers, self.shard_size, self.parallel_min_pages,
+                self.low_memory, memory_monitor, self.page_timeout
+            )
+        else:
+            source = PDFPageSource(file_path, self.low_memory, memory_monitor, self.page_timeout)
+        
+        if content_hash:
+            return CachedPageSource(self.db, content_hash, source, self.retry_skipped)
+        return source
+    
     def _extract_text_chunk(self, file_path: str, start_page: int, end_page: int) -> List[Dict]:
         """
         Extract text from a specific range of pages
         """
-        pages_text = []
+        with PDFPageSource(file_path) as source:
+            return list(source.iter_pages(start_page, end_page))
+    
+    def _extract_outline(self, file_path: str) -> List[Dict]:
+        """
+        Build TOC entries from the PDF outline (bookmarks), if it has one
+        """
+        entries = []
         
-        with pdfplumber.open(file_path) as pdf:
-            for page_num in range(start_page, end_page):
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    text = page.extract_text()
-                    if text:
-                        pages_text.append({
-                            'page_number': page_num + 1,
-                            'text': text.strip(),
-                            'bbox': page.bbox if hasattr(page, 'bbox') else None
-                        })
+        try:
+            reader = PyPDF2.PdfReader(file_path)
+            
+            def walk(items, level: int, parent_label: Optional[str]):
+                number = 0
+                for item in items:
+                    if isinstance(item, list):
+                        # A nested list holds the children of the preceding entry
+                        if entries and entries[-1]['level'] == level:
+                            walk(item, level + 1, entries[-1]['label'])
+                        continue
+                    
+                    page_index = reader.get_destination_page_number(item)
+                    if page_index is None or page_index < 0:
+                        continue
+                    
+                    # Numbers count within the parent; the dotted label locates the entry
+                    number += 1
+                    entries.append({
+                        'chapter_number': number,
+                        'label': str(number) if parent_label is None else f"{parent_label}.{number}",
+                        'title': str(item.title).strip(),
+                        'page_start': page_index + 1,
+                        'level': level
+                    })
+            
+            walk(reader.outline, 1, None)
+            
+        except Exception as e:
+            logger.error(f"Error reading PDF outline: {str(e)}")
+            return []
         
-        return pages_text
+        if entries:
+            logger.info(f"Found {len(entries)} outline entries in {file_path}")
+        return entries
     
-    def _extract_table_of_contents(self, file_path: str) -> List[Dict]:
+    def _extract_table_of_contents(self, pages: List[Dict]) -> List[Dict]:
         """
         Extract table of contents by looking for common TOC patterns
         """
@@ -94,82 +483,84 @@ class PDFProcessor:
         toc_found = False
         
         try:
-            with pdfplumber.open(file_path) as pdf:
-                # Look for TOC in first 20 pages
-                for page_num in range(min(20, len(pdf.pages))):
-                    page = pdf.pages[page_num]
-                    text = page.extract_text()
-                    
-                    if not text:
-                        continue
-                        
-                    lines = text.split('\n')
+            # Look for TOC in first 20 pages
+            for page_data in pages:
+                if page_data['page_number'] > TOC_SCAN_PAGES:
+                    break
+                text = page_data['text']
+                
+                if not text:
+                    continue
                     
-                    # Check if this looks like a TOC page
-                    toc_indicators = [
-                        'table of contents', 'contents', 'chapter', 'section'
-                    ]
+                lines = text.split('\n')
+                
+                # Check if this looks like a TOC page
+                toc_indicators = [
+                    'table of contents', 'contents', 'chapter', 'section'
+                ]
+                
+                page_text_lower = text.lower()
+                if any(indicator in page_text_lower for indicator in toc_indicators):
+                    toc_found = True
                     
-                    page_text_lower = text.lower()
-                    if any(indicator in page_text_lower for indicator in toc_indicators):
-                        toc_found = True
-                        
-                        # Extract chapter entries
-                        for line in lines:
-                            line = line.strip()
-                            if not line:
-                                continue
-                                
-                            # Look for patterns like "Chapter 1: Introduction ... 5"
-                            # or "1. Introduction ... 5"
-                            chapter_match = re.match(
-                                r'(?:chapter\s+)?(\d+)\.?\s*([^.]+?)\.{2,}(\d+)', 
-                                line.lower()
-                            )
+                    # Extract chapter entries
+                    for line in lines:
+                        line = line.strip()
+                        if not line:
+                            continue
                             
-                            if chapter_match:
-                                chapter_num = int(chapter_match.group(1))
-                                title = chapter_match.group(2).strip().title()
-                                page_start = int(chapter_match.group(3))
-                                
-                                toc_entries.append({
-                                    'chapter_number': chapter_num,
-                                    'title': title,
-                                    'page_start': page_start,
-                                    'level': 1
-                                })
+                        # Look for patterns like "Chapter 1: Introduction ... 5"
+                        # or "1. Introduction ... 5"
+                        chapter_match = re.match(
+                            r'(?:chapter\s+)?(\d+)\.?\s*([^.]+?)\.{2,}(\d+)', 
+                            line.lower()
+                        )
+                        
+                        if chapter_match:
+                            chapter_num = int(chapter_match.group(1))
+                            title = chapter_match.group(2).strip().title()
+                            page_start = int(chapter_match.group(3))
                             
-                            # Look for subchapter patterns
-                            subchapter_match = re.match(
-                                r'\s+(\d+\.\d+)\s+([^.]+?)\.{2,}(\d+)', 
-                                line
-                            )
+                            toc_entries.append({
+                                'chapter_number': chapter_num,
+                                'label': str(chapter_num),
+                                'title': title,
+                                'page_start': page_start,
+                                'level': 1
+                            })
+                        
+                        # Look for subchapter patterns
+                        subchapter_match = re.match(
+                            r'\s+(\d+\.\d+)\s+([^.]+?)\.{2,}(\d+)', 
+                            line
+                        )
+                        
+                        if subchapter_match:
+                            section_num = subchapter_match.group(1)
+                            title = subchapter_match.group(2).strip().title()
+                            page_start = int(subchapter_match.group(3))
                             
-                            if subchapter_match:
-                                section_num = subchapter_match.group(1)
-                                title = subchapter_match.group(2).strip().title()
-                                page_start = int(subchapter_match.group(3))
-                                
-                                toc_entries.append({
-                                    'chapter_number': section_num,
-                                    'title': title,
-                                    'page_start': page_start,
-                                    'level': 2
-                                })
-                    
-                    if toc_found and toc_entries:
-                        break
-            
+                            toc_entries.append({
+                                'chapter_number': int(section_num.rsplit('.', 1)[1]),
+                                'label': section_num,
+                                'title': title,
+                                'page_start': page_start,
+                                'level': 2
+                            })
+                
+                if toc_found and toc_entries:
+                    break
+
             # If no formal TOC found, try to infer chapters from headings
             if not toc_entries:
-                toc_entries = self._infer_chapters_from_headings(file_path)
+                toc_entries = self._infer_chapters_from_headings(pages)
                 
         except Exception as e:
             logger.error(f"Error extracting TOC: {str(e)}")
             
         return toc_entries
     
-    def _infer_chapters_from_headings(self, file_path: str) -> List[Dict]:
+    def _infer_chapters_from_headings(self, pages: List[Dict]) -> List[Dict]:
         """
         Infer chapter structure from document headings
         """
@@ -182,59 +573,111 @@ class PDFProcessor:
         ]
         
         try:
-            with pdfplumber.open(file_path) as pdf:
-                chapter_num = 0
+            chapter_num = 0
+            
+            for page_data in pages:
+                if page_data['page_number'] > HEADING_SCAN_PAGES:  # Check first 50 pages
+                    break
+                text = page_data['text']
+                if not text:
+                    continue
+                    
+                lines = text.split('\n')
                 
-                for page_num, page in enumerate(pdf.pages[:50]):  # Check first 50 pages
-                    text = page.extract_text()
-                    if not text:
+                for line in lines:
+                    line = line.strip()
+                    if len(line) < 5 or len(line) > 100:  # Skip very short/long lines
                         continue
                         
-                    lines = text.split('\n')
-                    
-                    for line in lines:
-                        line = line.strip()
-                        if len(line) < 5 or len(line) > 100:  # Skip very short/long lines
-                            continue
+                    for pattern in chapter_patterns:
+                        match = re.match(pattern, line.lower())
+                        if match:
+                            chapter_num += 1
+                            title = line.title()
+                            
+                            chapters.append({
+                                'chapter_number': chapter_num,
+                                'label': str(chapter_num),
+                                'title': title,
+                                'page_start': page_data['page_number'],
+                                'level': 1
+                            })
+                            break
                             
-                        for pattern in chapter_patterns:
-                            match = re.match(pattern, line.lower())
-                            if match:
-                                chapter_num += 1
-                                title = line.title()
-                                
-                                chapters.append({
-                                    'chapter_number': chapter_num,
-                                    'title': title,
-                                    'page_start': page_num + 1,
-                                    'level': 1
-                                })
-                                break
-                                
         except Exception as e:
             logger.error(f"Error inferring chapters: {str(e)}")
             
         return chapters
     
-    def _store_chapters(self, toc_entries: List[Dict], textbook_id: int):
+    def _store_chapters(self, toc_entries: List[Dict], textbook_id: int, total_pages: Optional[int] = None):
         """
-        Store extracted chapters in database
+        Store extracted chapters in database, linking each subchapter to the
+        closest preceding entry one level up and filling in page ranges
         """
         try:
-            for entry in toc_entries:
+            page_ends = _compute_page_ends(toc_entries, total_pages)
+            parents = {}  # Most recent chapter seen at each level
+            
+            for entry, page_end in zip(toc_entries, page_ends):
                 chapter = Chapter(
                     textbook_id=textbook_id,
                     title=entry['title'],
                     chapter_number=entry['chapter_number'],
+                    label=entry.get('label'),
                     page_start=entry['page_start'],
-                    level=entry['level']
+                    page_end=page_end,
+                    level=entry['level'],
+                    parent=parents.get(entry['level'] - 1)
                 )
                 
+                parents[entry['level']] = chapter
+                for deeper_level in [level for level in parents if level > entry['level']]:
+                    del parents[deeper_level]
+                
                 self.db.add(chapter)
             
             self.db.commit()
+            self.question_extractor.invalidate_chapters(textbook_id)
             logger.info(f"Stored {len(toc_entries)} chapters for textbook {textbook_id}")
             
         except Exception as e:
             logger.error(f"Error storing chapters: {str(e)}")
-            self.db.rollback()
\ No newline at end of file
+            self.db.rollback()
+
+
+def _chunked(pages: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    """
+    Group a stream of pages into lists of at most chunk_size pages
+    """
+    iterator = iter(pages)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _question_key(row) -> tuple:
+    """
+    Identity of a question row for re-extraction diffs
+    """
+    return tuple(row[name] for name in QUESTION_DIFF_COLUMNS)
+
+def _compute_page_ends(toc_entries: List[Dict], total_pages: Optional[int]) -> List[Optional[int]]:
+    """
+    A chapter ends the page before the next entry at the same or a higher
+    level starts; the last one at each level runs to the end of the book
+    """
+    page_ends = []
+    
+    for index, entry in enumerate(toc_entries):
+        page_end = total_pages
+        for following in toc_entries[index + 1:]:
+            if following['level'] <= entry['level']:
+                page_end = following['page_start'] - 1
+                break
+        
+        if page_end is not None and page_end < entry['page_start']:
+            page_end = entry['page_start']
+        page_ends.append(page_end)
+    
+    return page_ends
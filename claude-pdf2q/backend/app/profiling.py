@@ -0,0 +1,51 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PDF_PROFILE_DIR", "profiles")
+
+def profile_path(textbook_id: int) -> str:
+    """
+    Location of the stored profile for a textbook's last profiled job
+    """
+    return os.path.join(PROFILE_DIR, f"textbook_{textbook_id}.prof")
+
+def run_profiled(textbook_id: int, func: Callable, *args, **kwargs):
+    """
+    Run func under cProfile and store the stats for the textbook.
+
+    The stats are written to a temporary file and renamed into place, so a
+    download never sees a half-written profile. A failure to save the profile
+    is logged and does not affect the job's result.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = profile_path(textbook_id)
+            temp_path = f"{path}.tmp"
+            profiler.dump_stats(temp_path)
+            os.replace(temp_path, path)
+            logger.info(f"Saved processing profile for textbook {textbook_id} to {path}")
+        except Exception as e:
+            logger.error(f"Error saving profile for textbook {textbook_id}: {str(e)}")
+
+def profile_summary(textbook_id: int, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+    """
+    Render the textbook's stored profile as a pstats text report
+    """
+    path = profile_path(textbook_id)
+    if not os.path.exists(path):
+        return None
+
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROGRESS_WINDOW = 10.0  # Seconds of recent progress the pages/sec rate is measured over
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+_sink: Optional[Callable[[int, Dict], None]] = None  # Where this process publishes progress
+
+def set_progress_sink(sink: Optional[Callable[[int, Dict], None]]):
+    """
+    Route progress published in this process to sink instead of the local
+    board; job workers forward it to the web process this way
+    """
+    global _sink
+    _sink = sink
+
+def publish_progress(textbook_id: int, **fields):
+    """
+    Publish changed progress fields for a textbook; they are merged into its
+    latest snapshot on the board
+    """
+    fields['updated'] = datetime.utcnow().isoformat()
+    if _sink is not None:
+        _sink(textbook_id, fields)
+    else:
+        progress_board.update(textbook_id, fields)
+
+class ProgressTracker:
+    """
+    Pages processed, questions found, recent pages/sec and ETA of one
+    processing run, published after every chunk
+    """
+
+    def __init__(self, textbook_id: int, job_id: int, total_pages: int, pages_processed: int = 0, questions_found: int = 0):
+        self.textbook_id = textbook_id
+        self.job_id = job_id
+        self.total_pages = total_pages
+        self.pages_processed = pages_processed
+        self.questions_found = questions_found
+        self._samples = deque([(time.monotonic(), pages_processed)])  # (time, pages processed)
+
+    def start(self):
+        publish_progress(self.textbook_id, status="running", **self.snapshot())
+
+    def advance(self, page_number: int, questions: int):
+        """
+        Record that pages up to page_number are processed, with questions new questions
+        """
+        now = time.monotonic()
+        self.pages_processed = page_number
+        self.questions_found += questions
+        self._samples.append((now, page_number))
+        # Keep one sample older than the window so the rate always spans it
+        while len(self._samples) > 2 and now - self._samples[1][0] > PROGRESS_WINDOW:
+            self._samples.popleft()
+        publish_progress(self.textbook_id, **self.snapshot())
+
+    def snapshot(self) -> Dict:
+        (first_time, first_pages), (last_time, last_pages) = self._samples[0], self._samples[-1]
+        elapsed = last_time - first_time
+        pages_per_sec = (last_pages - first_pages) / elapsed if elapsed > 0 else None
+        remaining = max(0, (self.total_pages or 0) - self.pages_processed)
+        return {
+            'job_id': self.job_id,
+            'total_pages': self.total_pages,
+            'pages_processed': self.pages_processed,
+            'questions_found': self.questions_found,
+            'pages_per_sec': round(pages_per_sec, 2) if pages_per_sec is not None else None,
+            'eta_seconds': round(remaining / pages_per_sec, 1) if pages_per_sec else None
+        }
+
+class ProgressBoard:
+    """
+    Latest progress snapshot per textbook, held in the web process.
+
+    Updates arrive from worker threads; async subscribers are woken on their
+    own event loops, so streams are pushed rather than polled.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[int, Dict] = {}
+        self._versions: Dict[int, int] = {}
+        self._waiters: Dict[int, list] = {}  # textbook id -> [(loop, future)]
+        self._listeners: List[Callable[[int, Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[int, Dict], None]):
+        """
+        Call listener with the textbook id and changed fields of every update
+        """
+        self._listeners.append(listener)
+
+    def update(self, textbook_id: int, fields: Dict):
+        with self._lock:
+            snapshot = dict(self._snapshots.get(textbook_id, {'textbook_id': textbook_id}))
+            snapshot.update(fields)
+            self._snapshots[textbook_id] = snapshot
+            self._versions[textbook_id] = self._versions.get(textbook_id, 0) + 1
+            waiters = self._waiters.pop(textbook_id, [])
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        for listener in self._listeners:
+            listener(textbook_id, fields)
+
+    def get(self, textbook_id: int) -> Tuple[Optional[Dict], int]:
+        """
+        The textbook's latest snapshot and its version
+        """
+        with self._lock:
+            return self._snapshots.get(textbook_id), self._versions.get(textbook_id, 0)
+
+    async def wait(self, textbook_id: int, version: int, timeout: float) -> Tuple[Optional[Dict], int]:
+        """
+        Wait up to timeout seconds for a snapshot newer than version, then
+        return the latest snapshot and its version
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._versions.get(textbook_id, 0) == version:
+                self._waiters.setdefault(textbook_id, []).append((loop, future))
+            else:
+                future.set_result(None)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(textbook_id, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+        return self.get(textbook_id)
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+progress_board = ProgressBoard()
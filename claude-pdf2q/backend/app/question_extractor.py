@@ -1,50 +1,119 @@
 import re
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
+from .chapter_index import ChapterIndex
+from .keyword_matcher import KeywordMatcher
+from .metrics import PIPELINE_STAGE_SECONDS, PAGES_PROCESSED, QUESTIONS_EXTRACTED
 from .models import Question, Chapter
+from .near_duplicates import NearDuplicateIndex
+from .question_writer import QuestionWriter, INSERT_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Version of the extraction rules below. Bump it whenever the patterns, validation
+# or classification change, so stored textbooks can be re-extracted.
+EXTRACTOR_VERSION = 2
+
+# Patterns to identify questions, compiled into one scan. At each position the
+# alternatives are tried in the order listed; each captures the question text in
+# its own group. Alternatives sharing a prefix are factored so the scan only
+# does real work at digits and line starts.
+QUESTION_SCAN_RE = re.compile(r"""
+    \b\d+(?:
+        \.\s+(.+?\?)                      # "1. What is...?"
+      | \)\s+(.+?\?)                      # "1) What is...?"
+    )
+  | ^(?:
+        Q\d*[:.]?\s+(.+?\?)               # "Q1: What is...?" or "Q. What is...?"
+      | Question\s+\d*[:.]?\s+(.+?\?)     # "Question 1: What is...?"
+      | \d+\.\d+\s+(.+?\?)                # "1.1 What is...?"
+      | ([A-Z][^.!?]*\?)$                 # Standalone questions ending with ?
+    )
+""", re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+
+# Patterns for exercise sections, matched against lowercased text. They stay
+# separate: each starts with a literal, which the regex engine searches for far
+# faster than it can scan one case-insensitive alternation.
+EXERCISE_SECTION_PATTERNS = [
+    re.compile(r'exercises?'),
+    re.compile(r'problems?'),
+    re.compile(r'review\s+questions?'),
+    re.compile(r'practice\s+problems?'),
+    re.compile(r'homework'),
+    re.compile(r'assignments?'),
+    re.compile(r'study\s+questions?'),
+    re.compile(r'discussion\s+questions?'),
+]
+
+NUMBERED_LINE_RE = re.compile(r'^(\d+)[\.\)]\s+(.*)')
+
+# Context keywords that indicate educational content
+EDUCATIONAL_KEYWORDS = [
+    'chapter', 'section', 'exercise', 'problem', 'question',
+    'review', 'practice', 'homework', 'assignment', 'study',
+    'discuss', 'explain', 'describe', 'analyze', 'compare'
+]
+
+# Common question words a valid question may start with
+QUESTION_WORDS = ('what', 'how', 'why', 'when', 'where', 'which', 'who', 'does', 'is', 'are', 'can', 'will', 'would', 'should')
+
+# Question type indicators, in classification priority order
+QUESTION_TYPE_INDICATORS = {
+    'multiple_choice': ['a)', 'b)', 'c)', 'd)', 'choose', 'select'],
+    'true_false': ['true or false', 't/f', 'true/false'],
+    'essay': ['explain', 'describe', 'discuss', 'analyze', 'compare', 'contrast'],
+}
+
+# All keyword lists above in one matcher, so a candidate is scanned once
+QUESTION_KEYWORDS = KeywordMatcher({
+    'educational': EDUCATIONAL_KEYWORDS,
+    **QUESTION_TYPE_INDICATORS
+})
+EDUCATIONAL_BIT = QUESTION_KEYWORDS.bits['educational']
+QUESTION_TYPE_BITS = [
+    (QUESTION_KEYWORDS.bits[question_type], question_type)
+    for question_type in QUESTION_TYPE_INDICATORS
+]
+
 class QuestionExtractor:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, batch_size: int = INSERT_BATCH_SIZE):
         self.db = db
+        self.writer = QuestionWriter(db, batch_size)
+        self._chapter_indexes = {}  # textbook_id -> ChapterIndex
+        self._duplicate_indexes = {}  # textbook_id -> NearDuplicateIndex
+    
+    def extract_questions_from_text(self, pages_text: List[Dict], textbook_id: int, start_page: int, commit: bool = True) -> int:
+        """
+        Extract questions from a chunk of text pages.
         
-        # Patterns to identify questions
-        self.question_patterns = [
-            r'\b\d+\.\s+(.+?\?)',  # "1. What is...?"
-            r'\b\d+\)\s+(.+?\?)',  # "1) What is...?"
-            r'^Q\d*[:\.]?\s+(.+?\?)',  # "Q1: What is...?" or "Q. What is...?"
-            r'^Question\s+\d*[:\.]?\s+(.+?\?)',  # "Question 1: What is...?"
-            r'^\d+\.\d+\s+(.+?\?)',  # "1.1 What is...?"
-            r'^[A-Z][^.!?]*\?$',  # Standalone questions ending with ?
-        ]
+        Question rows are buffered on self.writer. With commit=True they are
+        inserted and committed before returning; with commit=False they stay
+        buffered so the caller can flush and commit them together with its
+        own bookkeeping.
+        """
+        questions_found = 0
         
-        # Patterns for exercise sections
-        self.exercise_section_patterns = [
-            r'(?i)exercises?',
-            r'(?i)problems?',
-            r'(?i)review\s+questions?',
-            r'(?i)practice\s+problems?',
-            r'(?i)homework',
-            r'(?i)assignments?',
-            r'(?i)study\s+questions?',
-            r'(?i)discussion\s+questions?',
-        ]
+        for row in self.question_rows(pages_text, textbook_id):
+            self.writer.add(row)
+            questions_found += 1
+                    
+        if commit and self.writer.pending > 0:
+            try:
+                with PIPELINE_STAGE_SECONDS.time("db_write"):
+                    self.writer.flush()
+                    self.db.commit()
+                logger.info(f"Extracted {questions_found} questions from pages {start_page}-{start_page + len(pages_text)}")
+            except Exception as e:
+                logger.error(f"Error committing questions: {str(e)}")
+                self.db.rollback()
         
-        # Context keywords that indicate educational content
-        self.educational_keywords = [
-            'chapter', 'section', 'exercise', 'problem', 'question',
-            'review', 'practice', 'homework', 'assignment', 'study',
-            'discuss', 'explain', 'describe', 'analyze', 'compare'
-        ]
+        return questions_found
     
-    def extract_questions_from_text(self, pages_text: List[Dict], textbook_id: int, start_page: int):
+    def question_rows(self, pages_text: List[Dict], textbook_id: int) -> Iterator[Dict]:
         """
-        Extract questions from a chunk of text pages
+        Yield question rows, as column dicts, for a chunk of text pages
         """
-        questions_found = 0
-        
         for page_data in pages_text:
             page_num = page_data['page_number']
             text = page_data['text']
@@ -53,58 +122,54 @@ class QuestionExtractor:
                 continue
                 
             # Find the appropriate chapter for this page
-            chapter = self._find_chapter_for_page(textbook_id, page_num)
+            with PIPELINE_STAGE_SECONDS.time("chapter_lookup"):
+                chapter_id = self._find_chapter_for_page(textbook_id, page_num)
             
             # Extract questions from this page
-            page_questions = self._extract_questions_from_page(text, page_num)
+            with PIPELINE_STAGE_SECONDS.time("question_scan"):
+                page_questions = self._extract_questions_from_page(text, page_num)
+            
+            # Skip near-duplicates of questions already seen anywhere in this textbook
+            with PIPELINE_STAGE_SECONDS.time("near_duplicates"):
+                duplicates = self._duplicate_index(textbook_id)
+                page_questions = [
+                    question_data for question_data in page_questions
+                    if not duplicates.is_duplicate(question_data['text'])
+                ]
             
-            # Store questions in database
+            PAGES_PROCESSED.inc()
+            QUESTIONS_EXTRACTED.inc(len(page_questions))
             for question_data in page_questions:
-                try:
-                    question = Question(
-                        textbook_id=textbook_id,
-                        chapter_id=chapter.id if chapter else None,
-                        question_text=question_data['text'],
-                        question_type=question_data['type'],
-                        page_number=page_num,
-                        context=question_data['context'],
-                        answer=question_data.get('answer')
-                    )
-                    
-                    self.db.add(question)
-                    questions_found += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error storing question: {str(e)}")
-                    
-        if questions_found > 0:
-            try:
-                self.db.commit()
-                logger.info(f"Extracted {questions_found} questions from pages {start_page}-{start_page + len(pages_text)}")
-            except Exception as e:
-                logger.error(f"Error committing questions: {str(e)}")
-                self.db.rollback()
+                yield {
+                    'textbook_id': textbook_id,
+                    'chapter_id': chapter_id,
+                    'question_text': question_data['text'],
+                    'question_type': question_data['type'],
+                    'page_number': page_num,
+                    'context': question_data['context'],
+                    'answer': question_data.get('answer')
+                }
     
     def _extract_questions_from_page(self, text: str, page_num: int) -> List[Dict]:
         """
         Extract individual questions from a page of text
         """
         questions = []
-        lines = text.split('\n')
         
         # Check if this page contains an exercise section
         is_exercise_section = self._is_exercise_section(text)
         
         # Extract questions using different strategies
         if is_exercise_section:
-            questions.extend(self._extract_from_exercise_section(text, lines))
+            questions.extend(self._extract_from_exercise_section(text))
         else:
-            questions.extend(self._extract_scattered_questions(text, lines))
+            questions.extend(self._extract_scattered_questions(text))
             
         # Add context and metadata to questions
-        for question in questions:
-            question['context'] = self._get_question_context(question['text'], text)
-            question['type'] = self._classify_question_type(question['text'])
+        question_types = self.classify_questions([question['text'] for question in questions])
+        for question, (_, question_type) in zip(questions, question_types):
+            question['context'] = self._get_question_context(question['span'], text)
+            question['type'] = question_type
             
         return questions
     
@@ -115,8 +180,8 @@ class QuestionExtractor:
         text_lower = text.lower()
         
         # Check for exercise section headers
-        for pattern in self.exercise_section_patterns:
-            if re.search(pattern, text_lower):
+        for pattern in EXERCISE_SECTION_PATTERNS:
+            if pattern.search(text_lower):
                 return True
                 
         # Check for high density of question marks
@@ -128,151 +193,188 @@ class QuestionExtractor:
                 
         return False
     
-    def _extract_from_exercise_section(self, text: str, lines: List[str]) -> List[Dict]:
+    def _extract_from_exercise_section(self, text: str) -> List[Dict]:
         """
         Extract questions from a dedicated exercise section
         """
         questions = []
         current_question = ""
         question_number = None
+        question_span = None
+        line_start = 0
         
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if this line starts a new question
-            question_start_match = re.match(r'^(\d+)[\.\)]\s+(.*)', line)
-            if question_start_match:
-                # Save previous question if exists
-                if current_question and '?' in current_question:
-                    questions.append({
-                        'text': current_question.strip(),
-                        'number': question_number
-                    })
-                
-                # Start new question
-                question_number = question_start_match.group(1)
-                current_question = question_start_match.group(2)
-            else:
-                # Continue current question
-                if current_question:
+        for raw_line in text.split('\n'):
+            line_end = line_start + len(raw_line)
+            line = raw_line.strip()
+            
+            if line:
+                # Check if this line starts a new question
+                question_start_match = NUMBERED_LINE_RE.match(line)
+                if question_start_match:
+                    # Save previous question if exists
+                    if current_question and '?' in current_question:
+                        questions.append({
+                            'text': current_question.strip(),
+                            'number': question_number,
+                            'span': question_span
+                        })
+                    
+                    # Start new question
+                    question_number = question_start_match.group(1)
+                    current_question = question_start_match.group(2)
+                    question_span = (line_start, line_end)
+                elif current_question:
+                    # Continue current question
                     current_question += " " + line
+                    question_span = (question_span[0], line_end)
+            
+            line_start = line_end + 1
                     
         # Don't forget the last question
         if current_question and '?' in current_question:
             questions.append({
                 'text': current_question.strip(),
-                'number': question_number
+                'number': question_number,
+                'span': question_span
             })
             
         return questions
     
-    def _extract_scattered_questions(self, text: str, lines: List[str]) -> List[Dict]:
+    def _extract_scattered_questions(self, text: str) -> List[Dict]:
         """
-        Extract questions scattered throughout regular text
+        Extract questions scattered throughout regular text in one scan
         """
         questions = []
-        
-        # Use regex patterns to find questions
-        for pattern in self.question_patterns:
-            matches = re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE)
-            for match in matches:
-                question_text = match.group(1) if match.groups() else match.group(0)
-                question_text = question_text.strip()
-                
-                # Validate the question
-                if self._is_valid_question(question_text):
-                    questions.append({
-                        'text': question_text,
-                        'number': None
-                    })
-                    
-        # Remove duplicates
         seen_questions = set()
-        unique_questions = []
         
-        for question in questions:
+        # Every pattern ends in a question mark
+        if '?' not in text:
+            return questions
+        
+        candidates = []
+        for match in QUESTION_SCAN_RE.finditer(text):
+            group_index = match.lastindex
+            candidates.append((match.group(group_index).strip(), match.span(group_index)))
+        
+        # Validate all candidates in one batch
+        validity = self.classify_questions([question_text for question_text, _ in candidates])
+        
+        for (question_text, span), (is_valid, _) in zip(candidates, validity):
+            if not is_valid:
+                continue
+            
             # Use first 50 characters as key for duplicate detection
-            key = question['text'][:50].lower()
-            if key not in seen_questions:
-                seen_questions.add(key)
-                unique_questions.append(question)
+            key = question_text[:50].lower()
+            if key in seen_questions:
+                continue
+            seen_questions.add(key)
+            
+            questions.append({
+                'text': question_text,
+                'number': None,
+                'span': span
+            })
                 
-        return unique_questions
+        return questions
     
-    def _is_valid_question(self, text: str) -> bool:
+    def classify_questions(self, texts: List[str]) -> List[Tuple[bool, str]]:
         """
-        Validate if the extracted text is actually a meaningful question
+        Validate and classify a batch of candidate questions, returning
+        (is_valid, question_type) for each with a single keyword scan per text
         """
-        if not text or len(text) < 10:
-            return False
+        scan = QUESTION_KEYWORDS.scan
+        results = []
+        
+        for text in texts:
+            text_lower = text.lower()
+            mask = scan(text_lower)
             
-        if not text.endswith('?'):
-            return False
+            is_valid = (
+                len(text) >= 10 and text.endswith('?') and
+                bool(mask & EDUCATIONAL_BIT or text_lower.startswith(QUESTION_WORDS))
+            )
             
-        # Check for educational keywords
-        text_lower = text.lower()
-        has_educational_keyword = any(
-            keyword in text_lower for keyword in self.educational_keywords
-        )
-        
-        # Check for common question words
-        question_words = ['what', 'how', 'why', 'when', 'where', 'which', 'who', 'does', 'is', 'are', 'can', 'will', 'would', 'should']
-        starts_with_question_word = any(
-            text_lower.startswith(word) for word in question_words
-        )
+            question_type = 'short_answer'  # Short answer (default)
+            for bit, indicator_type in QUESTION_TYPE_BITS:
+                if mask & bit:
+                    question_type = indicator_type
+                    break
+            
+            results.append((is_valid, question_type))
         
-        return has_educational_keyword or starts_with_question_word
+        return results
+    
+    def _is_valid_question(self, text: str) -> bool:
+        """
+        Validate if the extracted text is actually a meaningful question
+        """
+        return self.classify_questions([text])[0][0]
     
     def _classify_question_type(self, question_text: str) -> str:
         """
         Classify the type of question based on its content
         """
-        text_lower = question_text.lower()
-        
-        # Multiple choice indicators
-        if any(indicator in text_lower for indicator in ['a)', 'b)', 'c)', 'd)', 'choose', 'select']):
-            return 'multiple_choice'
-            
-        # True/false indicators
-        if any(indicator in text_lower for indicator in ['true or false', 't/f', 'true/false']):
-            return 'true_false'
-            
-        # Essay/long answer indicators
-        if any(indicator in text_lower for indicator in ['explain', 'describe', 'discuss', 'analyze', 'compare', 'contrast']):
-            return 'essay'
-            
-        # Short answer (default)
-        return 'short_answer'
+        return self.classify_questions([question_text])[0][1]
     
-    def _get_question_context(self, question_text: str, full_text: str) -> str:
+    def _get_question_context(self, span: Tuple[int, int], full_text: str) -> str:
         """
-        Extract surrounding context for a question
+        Extract surrounding context for a question from its match span
         """
-        # Find the question in the full text
-        question_index = full_text.find(question_text)
-        if question_index == -1:
-            return ""
-            
+        question_start, question_end = span
+        
         # Get context before and after (up to 200 characters each)
-        start_context = max(0, question_index - 200)
-        end_context = min(len(full_text), question_index + len(question_text) + 200)
+        start_context = max(0, question_start - 200)
+        end_context = min(len(full_text), question_end + 200)
         
         context = full_text[start_context:end_context]
         return context.strip()
     
-    def _find_chapter_for_page(self, textbook_id: int, page_num: int) -> Optional[Chapter]:
+    def duplicates_suppressed(self, textbook_id: int) -> int:
         """
-        Find the chapter that contains the given page number
+        Number of near-duplicate questions skipped for a textbook by this extractor
         """
-        try:
-            chapter = self.db.query(Chapter).filter(
-                Chapter.textbook_id == textbook_id,
-                Chapter.page_start <= page_num
-            ).order_by(Chapter.page_start.desc()).first()
-            
-            return chapter
-        except Exception as e:
-            logger.error(f"Error finding chapter for page {page_num}: {str(e)}")
-            return None
\ No newline at end of file
+        index = self._duplicate_indexes.get(textbook_id)
+        return index.suppressed if index else 0
+    
+    def reset_duplicates(self, textbook_id: int):
+        """
+        Start the textbook's near-duplicate index empty instead of seeding it
+        from stored questions, for a pass that regenerates all of them
+        """
+        self._duplicate_indexes[textbook_id] = NearDuplicateIndex()
+    
+    def _duplicate_index(self, textbook_id: int) -> NearDuplicateIndex:
+        """
+        Near-duplicate index for a textbook, seeded with any questions already
+        stored for it so resumed jobs keep deduplicating against earlier pages
+        """
+        index = self._duplicate_indexes.get(textbook_id)
+        if index is None:
+            index = NearDuplicateIndex()
+            stored = self.db.query(Question.question_text).filter(
+                Question.textbook_id == textbook_id
+            ).all()
+            index.add_many(row.question_text for row in stored if row.question_text)
+            self._duplicate_indexes[textbook_id] = index
+        return index
+    
+    def invalidate_chapters(self, textbook_id: int):
+        """
+        Drop the cached chapter index after a textbook's chapters change
+        """
+        self._chapter_indexes.pop(textbook_id, None)
+    
+    def _find_chapter_for_page(self, textbook_id: int, page_num: int) -> Optional[int]:
+        """
+        Find the id of the most specific chapter that contains the given page number
+        """
+        index = self._chapter_indexes.get(textbook_id)
+        if index is None:
+            try:
+                index = ChapterIndex.load(self.db, textbook_id)
+            except Exception as e:
+                logger.error(f"Error loading chapters for textbook {textbook_id}: {str(e)}")
+                return None
+            self._chapter_indexes[textbook_id] = index
+        
+        return index.chapter_id_for_page(page_num)
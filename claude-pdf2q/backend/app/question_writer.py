@@ -0,0 +1,53 @@
+import logging
+import os
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = int(os.environ.get("QUESTION_INSERT_BATCH_SIZE", 500))
+
+class QuestionWriter:
+    """
+    Buffers question rows as plain dicts and writes them with executemany
+    inserts, bypassing per-object unit-of-work bookkeeping
+    """
+
+    def __init__(self, db: Session, batch_size: int = INSERT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self._rows: List[Dict] = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: Dict):
+        self._rows.append(row)
+
+    def flush(self) -> int:
+        """
+        Insert all buffered rows in batch_size statements within the session's
+        current transaction; the caller decides when to commit
+        """
+        rows, self._rows = self._rows, []
+
+        for start in range(0, len(rows), self.batch_size):
+            self.db.execute(insert(Question), rows[start:start + self.batch_size])
+
+        return len(rows)
+
+    def take(self) -> List[Dict]:
+        """
+        Remove and return the buffered rows, for writing elsewhere
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def discard(self):
+        """
+        Drop buffered rows, e.g. after the transaction they belonged to failed
+        """
+        self._rows = []
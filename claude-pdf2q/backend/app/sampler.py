@@ -0,0 +1,315 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .metrics import SAMPLER_LOADS
+from .models import Question
+from .progress import TERMINAL_STATUSES, progress_board
+
+SAMPLER_CACHE_FILTERS = int(os.environ.get("QUESTION_SAMPLER_FILTERS", 256))  # Filters whose question ids are kept in memory
+SAMPLER_CACHE_TTL = float(os.environ.get("QUESTION_SAMPLER_TTL", 300))  # Seconds before cached ids are reloaded, picking up checkpoints of running jobs
+SAMPLER_MAX_SESSIONS = int(os.environ.get("QUESTION_SAMPLER_SESSIONS", 10000))  # No-repeat sessions remembered, least recently used dropped first
+
+FilterKey = Tuple[Optional[int], Optional[int], Optional[str]]  # (textbook id, chapter id, question type)
+STRATA_DIMENSIONS = ("chapter", "question_type")  # What quizzes can be stratified by
+
+class _FilterIds:
+    """
+    Ids of the questions matching one filter, in id order, with each one's
+    chapter and type in parallel arrays
+    """
+
+    def __init__(self, rows: Sequence[Tuple[int, Optional[int], Optional[str]]], version: int):
+        self.ids = array('q')
+        self.chapters = array('q')  # 0 for questions without a chapter
+        self.types = array('H')  # Index into type_names
+        type_indexes = {}
+        for question_id, chapter_id, question_type in rows:
+            self.ids.append(question_id)
+            self.chapters.append(chapter_id or 0)
+            self.types.append(type_indexes.setdefault(question_type, len(type_indexes)))
+        self.type_names = tuple(type_indexes)
+        self.version = version
+        self.loaded = time.monotonic()
+        self._strata: Dict[Tuple[str, ...], Dict[tuple, array]] = {}
+
+    def strata(self, dimensions: Tuple[str, ...]) -> Dict[tuple, array]:
+        """
+        Positions of the ids grouped by their values along dimensions, e.g.
+        (chapter id, question type) -> positions; built once per dimensions
+        """
+        groups = self._strata.get(dimensions)
+        if groups is None:
+            groups = {}
+            for position in range(len(self.ids)):
+                key = tuple(self.value(dimension, position) for dimension in dimensions)
+                groups.setdefault(key, array('q')).append(position)
+            self._strata[dimensions] = groups
+        return groups
+
+    def value(self, dimension: str, position: int):
+        if dimension == "chapter":
+            return self.chapters[position] or None
+        return self.type_names[self.types[position]]
+
+class _Round:
+    """
+    Questions one session has been served for one filter in the current round.
+
+    The ids not served yet form a lazily shuffled permutation: swaps holds
+    only the positions a Fisher-Yates shuffle has moved, so each draw is O(1)
+    and memory grows with the draws, not with the filter's size.
+    """
+
+    __slots__ = ('version', 'drawn', 'swaps', 'served')
+
+    def __init__(self):
+        self.version = None
+        self.drawn = 0
+        self.swaps: Dict[int, int] = {}
+        self.served = set()
+
+class QuestionSampler:
+    """
+    Random question ids for any textbook/chapter/type filter in O(1).
+
+    Each filter's matching ids are loaded once into a compact array and
+    sampled by index. A filter's ids are dropped when a job on its textbook
+    finishes, and reloaded after SAMPLER_CACHE_TTL in any case. With a
+    session id, no question is repeated until the session has seen every
+    question matching the filter. Quizzes draw many distinct ids at once,
+    optionally stratified by chapter and question type.
+    """
+
+    def __init__(
+        self,
+        max_filters: int = SAMPLER_CACHE_FILTERS,
+        ttl: float = SAMPLER_CACHE_TTL,
+        max_sessions: int = SAMPLER_MAX_SESSIONS
+    ):
+        self.max_filters = max(1, max_filters)
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._ids: OrderedDict = OrderedDict()  # filter -> _FilterIds
+        self._rounds: OrderedDict = OrderedDict()  # (session, filter) -> _Round
+        self._loads: Dict[FilterKey, asyncio.Lock] = {}  # Filters being loaded
+        self._version = 0
+        self._lock = threading.Lock()  # Invalidation arrives from the job report thread
+
+    async def sample(
+        self,
+        db: AsyncSession,
+        textbook_id: Optional[int] = None,
+        chapter_id: Optional[int] = None,
+        question_type: Optional[str] = None,
+        session: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Id of a random question matching the filters, or None if none match
+        """
+        key = (textbook_id, chapter_id, question_type)
+        entry = self._cached(key) or await self._load(db, key)
+        if not entry.ids:
+            return None
+        if session is None:
+            return entry.ids[random.randrange(len(entry.ids))]
+        return self._draw(session, key, entry.ids, entry.version)
+
+    async def sample_many(
+        self,
+        db: AsyncSession,
+        count: int,
+        textbook_id: Optional[int] = None,
+        chapter_id: Optional[int] = None,
+        question_type: Optional[str] = None,
+        stratify: Tuple[str, ...] = (),
+        weights: Optional[Dict[str, Dict]] = None,
+        proportional: bool = False,
+        seed: Optional[int] = None
+    ) -> Tuple[List[int], List[Dict]]:
+        """
+        Up to count distinct random question ids matching the filters, and a
+        summary of the strata they were drawn from.
+
+        Questions are grouped into strata by the stratify dimensions and count
+        is split between the strata in proportion to their weights: 1 unless
+        weights[dimension][value] says otherwise, multiplied across dimensions
+        and, if proportional, by the stratum's size. A stratum never gets more
+        questions than it has; the rest go to the others. The same seed gives
+        the same quiz as long as the matching questions are unchanged.
+        """
+        key = (textbook_id, chapter_id, question_type)
+        entry = self._cached(key) or await self._load(db, key)
+        rng = random.Random(seed)
+        weights = weights or {}
+
+        strata = entry.strata(stratify) if stratify else {(): range(len(entry.ids))}
+        keys = list(strata)
+        capacities = [len(strata[stratum]) for stratum in keys]
+        stratum_weights = []
+        for stratum, capacity in zip(keys, capacities):
+            weight = float(capacity) if proportional else 1.0
+            for dimension, value in zip(stratify, stratum):
+                weight *= weights.get(dimension, {}).get(value, 1.0)
+            stratum_weights.append(weight)
+
+        question_ids = []
+        summary = []
+        for stratum, allocated in zip(keys, _allocate(count, capacities, stratum_weights, rng)):
+            positions = strata[stratum]
+            picked = rng.sample(range(len(positions)), allocated)
+            question_ids.extend(entry.ids[positions[index]] for index in picked)
+            summary.append({**dict(zip(stratify, stratum)), 'available': len(positions), 'selected': allocated})
+
+        rng.shuffle(question_ids)
+        return question_ids, summary
+
+    def invalidate(self, textbook_id: Optional[int] = None):
+        """
+        Drop cached ids of filters covering textbook_id, or of all filters
+        """
+        with self._lock:
+            for key in list(self._ids):
+                if textbook_id is None or key[0] in (None, textbook_id):
+                    del self._ids[key]
+
+    def on_progress(self, textbook_id: int, fields: Dict):
+        """
+        Progress board listener: a finished job may have changed the textbook's questions
+        """
+        if fields.get('status') in TERMINAL_STATUSES:
+            self.invalidate(textbook_id)
+
+    def _cached(self, key: FilterKey) -> Optional[_FilterIds]:
+        with self._lock:
+            entry = self._ids.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.loaded > self.ttl:
+                del self._ids[key]
+                return None
+            self._ids.move_to_end(key)
+            return entry
+
+    async def _load(self, db: AsyncSession, key: FilterKey) -> _FilterIds:
+        """
+        Load the filter's ids; concurrent requests for the same filter wait
+        for one query instead of each running it
+        """
+        lock = self._loads.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                return self._cached(key) or await self._query(db, key)
+        finally:
+            if self._loads.get(key) is lock and not lock.locked():
+                del self._loads[key]
+
+    async def _query(self, db: AsyncSession, key: FilterKey) -> _FilterIds:
+        textbook_id, chapter_id, question_type = key
+        query = select(Question.id, Question.chapter_id, Question.question_type)
+
+        if textbook_id:
+            query = query.where(Question.textbook_id == textbook_id)
+
+        if chapter_id:
+            query = query.where(Question.chapter_id == chapter_id)
+
+        if question_type:
+            query = query.where(Question.question_type == question_type)
+
+        rows = (await db.execute(query.order_by(Question.id))).all()
+        SAMPLER_LOADS.inc()
+
+        with self._lock:
+            self._version += 1
+            entry = self._ids[key] = _FilterIds(rows, self._version)
+            while len(self._ids) > self.max_filters:
+                self._ids.popitem(last=False)
+            return entry
+
+    def _draw(self, session: str, key: FilterKey, ids: array, version: int) -> int:
+        with self._lock:
+            state = self._rounds.get((session, key))
+            if state is None:
+                state = self._rounds[(session, key)] = _Round()
+                while len(self._rounds) > self.max_sessions:
+                    self._rounds.popitem(last=False)
+            self._rounds.move_to_end((session, key))
+
+            if state.version != version:
+                _rebase(state, ids, version)
+            if state.drawn >= len(ids):
+                # Every question was served; start another round
+                state.drawn = 0
+                state.swaps.clear()
+                state.served.clear()
+
+            position = _swap(state, random.randrange(state.drawn, len(ids)))
+            question_id = ids[position]
+            state.served.add(question_id)
+            return question_id
+
+def _allocate(count: int, capacities: List[int], weights: List[float], rng: random.Random) -> List[int]:
+    """
+    Split count between strata in proportion to weights without exceeding
+    any stratum's capacity: each pass hands out whole shares, then the last
+    units go to the largest fractional shares (ties broken by rng)
+    """
+    allocated = [0] * len(capacities)
+    remaining = min(count, sum(capacity for capacity, weight in zip(capacities, weights) if weight > 0))
+
+    while remaining > 0:
+        active = [i for i, weight in enumerate(weights) if weight > 0 and allocated[i] < capacities[i]]
+        total = sum(weights[i] for i in active)
+        shares = {i: remaining * weights[i] / total for i in active}
+
+        given = 0
+        for i in active:
+            take = min(int(shares[i]), capacities[i] - allocated[i])
+            allocated[i] += take
+            given += take
+
+        if given == 0:
+            # Every share is below one question
+            by_fraction = sorted(active, key=lambda i: (-shares[i], rng.random()))
+            for i in by_fraction[:remaining]:
+                allocated[i] += 1
+                given += 1
+        remaining -= given
+
+    return allocated
+
+def _swap(state: _Round, index: int) -> int:
+    """
+    One Fisher-Yates step: take the id position at index and move the next
+    undrawn one into its place. Positions below the cursor are never read
+    again, so their entries are dropped.
+    """
+    position = state.swaps.get(index, index)
+    state.swaps[index] = state.swaps.get(state.drawn, state.drawn)
+    state.swaps.pop(state.drawn, None)
+    state.drawn += 1
+    return position
+
+def _rebase(state: _Round, ids: array, version: int):
+    """
+    Carry a round over to a reloaded id array, so questions already served
+    stay excluded; O(len(ids)), like the reload itself
+    """
+    state.version = version
+    state.drawn = 0
+    state.swaps.clear()
+    if not state.served:
+        return
+    for index, question_id in enumerate(ids):
+        if question_id in state.served:
+            _swap(state, index)
+
+question_sampler = QuestionSampler()
+progress_board.add_listener(question_sampler.on_progress)
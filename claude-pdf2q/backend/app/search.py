@@ -0,0 +1,116 @@
+import html
+import logging
+import re
+from typing import Optional
+from sqlalchemy import column, func, literal_column, table, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "questions_fts"
+SNIPPET_TOKENS = 16  # Tokens of text around the matches shown in a result snippet
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Placeholders snippet() wraps matches in, swapped for the tags once the text is HTML-escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+BM25_WEIGHTS = (1.0, 0.4)  # Relevance weight of question_text and context matches
+
+questions_fts = table(SEARCH_TABLE, column("rowid"))
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+def create_search_index(connection: Connection):
+    """
+    Create the FTS5 index over question text and context and the triggers
+    that keep it in sync with the questions table. An index created for a
+    database that already holds questions is filled from them.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+    ).first()
+
+    if not exists:
+        # External content: the index stores tokens only and reads text back from questions
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"question_text, context, content='questions', content_rowid='id', "
+            f"tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+        logger.info("Built full-text search index over existing questions")
+
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON questions BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, question_text, context) "
+        f"VALUES (new.id, new.question_text, new.context); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON questions BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, question_text, context) "
+        f"VALUES ('delete', old.id, old.question_text, old.context); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF question_text, context ON questions BEGIN "
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, question_text, context) "
+        f"VALUES ('delete', old.id, old.question_text, old.context); "
+        f"INSERT INTO {SEARCH_TABLE}(rowid, question_text, context) "
+        f"VALUES (new.id, new.question_text, new.context); END"
+    ))
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Turn a user's search text into an FTS5 MATCH expression.
+
+    Words must all match; a word ending in * matches as a prefix and text in
+    double quotes as a phrase. Everything else is quoted, so operators and
+    punctuation in the input cannot break the expression. Returns None when
+    nothing searchable is left.
+    """
+    terms = []
+    for phrase, word in _TERM.findall(query):
+        tokens = re.findall(r"\w+", phrase or word)
+        if not tokens:
+            continue
+        term = '"' + " ".join(tokens) + '"'
+        if word.endswith("*"):
+            term += "*"
+        terms.append(term)
+    return " ".join(terms) or None
+
+def search_match(expression: str):
+    """
+    WHERE clause matching the index against an expression from match_expression()
+    """
+    return literal_column(SEARCH_TABLE).op("MATCH")(expression)
+
+def search_rank():
+    """
+    BM25 relevance of the current match; lower is more relevant
+    """
+    return func.bm25(literal_column(SEARCH_TABLE), *BM25_WEIGHTS)
+
+def search_snippet():
+    """
+    Fragment of the best-matching column with the matched terms between
+    placeholders; pass it through highlight_snippet() before returning it
+    """
+    return func.snippet(
+        literal_column(SEARCH_TABLE), -1, _MATCH_START, _MATCH_END, "…", SNIPPET_TOKENS
+    )
+
+def highlight_snippet(snippet: Optional[str]) -> Optional[str]:
+    """
+    HTML-escape a search_snippet() fragment, which is raw text from an
+    uploaded PDF, and mark its matched terms with HIGHLIGHT_START/END tags
+    """
+    if snippet is None:
+        return None
+    # The placeholders are control characters, which extracted text should not
+    # contain; any that it does are dropped rather than turned into tags
+    parts = html.escape(snippet).split(_MATCH_START)
+    highlighted = [parts[0].replace(_MATCH_END, "")]
+    for part in parts[1:]:
+        term, _, rest = part.partition(_MATCH_END)
+        highlighted.append(HIGHLIGHT_START + term + HIGHLIGHT_END + rest.replace(_MATCH_END, ""))
+    return "".join(highlighted)
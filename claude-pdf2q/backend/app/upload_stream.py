@@ -0,0 +1,125 @@
+import hashlib
+import os
+import uuid
+from typing import Dict
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_UPLOAD_BYTES = int(os.environ.get("PDF_MAX_UPLOAD_MB", 200)) * 1024 * 1024  # Larger uploads are rejected with 413
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for boundaries and part headers when checking Content-Length
+MAX_BOUNDARY_BYTES = 70  # Longest multipart boundary RFC 2046 allows
+
+async def receive_upload(request: Request, directory: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Dict:
+    """
+    Stream the "file" part of a multipart upload into a temporary file in
+    directory, hashing and size-checking it as it arrives.
+
+    The body is never buffered in memory or spooled twice, and file writes run
+    off the event loop. Oversize uploads are rejected with 413, from the
+    Content-Length header when the client sends one and otherwise as soon as
+    the limit is crossed. Malformed multipart bodies are rejected with 400.
+    Returns the original filename, the temporary path, the size and the
+    SHA-256 hex digest; the caller renames the temporary file into place or
+    removes it. On any error the temporary file is removed here.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    if not 0 < len(params[b"boundary"]) <= MAX_BOUNDARY_BYTES:
+        raise HTTPException(status_code=400, detail="Invalid multipart boundary")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    # The parser reports parts through callbacks; queue them and handle them
+    # after each write, where awaiting file I/O is possible
+    events = []
+    parser = MultipartParser(params[b"boundary"], {
+        'on_part_begin': lambda: events.append(('part', b'')),
+        'on_header_field': lambda data, start, end: events.append(('header_field', data[start:end])),
+        'on_header_value': lambda data, start, end: events.append(('header_value', data[start:end])),
+        'on_header_end': lambda: events.append(('header_end', b'')),
+        'on_headers_finished': lambda: events.append(('headers_finished', b'')),
+        'on_part_data': lambda data, start, end: events.append(('data', data[start:end])),
+        'on_part_end': lambda: events.append(('part_end', b''))
+    })
+
+    digest = hashlib.sha256()
+    size = 0
+    original_name = None
+    temp_path = None
+    output = None
+    in_file = False
+    file_complete = False
+    headers = {}
+    field = value = b''
+
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except FormParserError as e:
+                raise HTTPException(status_code=400, detail=f"Malformed multipart upload: {str(e)}")
+
+            for event, data in events:
+                if event == 'part':
+                    headers = {}
+                elif event == 'header_field':
+                    field += data
+                elif event == 'header_value':
+                    value += data
+                elif event == 'header_end':
+                    headers[field.lower()] = value
+                    field = value = b''
+                elif event == 'headers_finished':
+                    _, options = parse_options_header(headers.get(b'content-disposition', b''))
+                    in_file = options.get(b'name') == b'file' and b'filename' in options and output is None
+                    if in_file:
+                        original_name = options[b'filename'].decode('utf-8', 'replace')
+                        if not original_name.lower().endswith('.pdf'):
+                            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+                        temp_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+                        output = await aiofiles.open(temp_path, "wb")
+                elif event == 'data' and in_file:
+                    size += len(data)
+                    if size > max_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+                        )
+                    digest.update(data)
+                    await output.write(data)
+                elif event == 'part_end':
+                    file_complete = file_complete or in_file
+                    in_file = False
+            events.clear()
+
+        parser.finalize()
+        if output is None:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        if not file_complete:
+            raise HTTPException(status_code=400, detail="Malformed multipart upload: the file part is incomplete")
+        await output.close()
+
+    except BaseException:
+        # Includes client disconnects, which cancel the request task
+        if output is not None:
+            await output.close()
+            await aiofiles.os.remove(temp_path)
+        raise
+
+    return {
+        'original_name': original_name,
+        'temp_path': temp_path,
+        'size': size,
+        'content_hash': digest.hexdigest()
+    }
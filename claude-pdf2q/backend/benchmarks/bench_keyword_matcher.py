@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare question validation and classification through the previous
+per-call keyword list scans against the precomputed keyword matcher.
+
+Usage:
+    python benchmarks/bench_keyword_matcher.py [--pages 3000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.question_extractor import QuestionExtractor
+from bench_question_scan import LegacyScanner, make_page
+
+
+def candidates_from(pages):
+    extractor = QuestionExtractor(None)
+    texts = []
+    for page in pages:
+        texts.extend(match['text'] for match in extractor._extract_from_exercise_section(page))
+        for line in page.split('\n'):
+            if line.endswith('?'):
+                texts.append(line)
+    return texts
+
+
+def run(label, func, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = func(texts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<12} {len(texts):>7} candidates  {best:7.3f}s  {len(texts) / best:10.0f} candidates/sec")
+    return results, len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=3000, help="synthetic pages to draw candidates from")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode; the best is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    texts = candidates_from([make_page(rnd) for _ in range(args.pages)])
+
+    legacy = LegacyScanner(None)
+    extractor = QuestionExtractor(None)
+
+    before, before_rate = run(
+        "per-call", lambda batch: [
+            (legacy._is_valid_question(text), legacy._classify_question_type(text)) for text in batch
+        ], texts, args.repeat
+    )
+    after, after_rate = run("batch", extractor.classify_questions, texts, args.repeat)
+
+    assert before == after, "matcher results differ from the per-call scans"
+    print(f"speedup      {after_rate / before_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare page throughput of the legacy multi-open extraction against the
+single-open streaming page source and the process-pool page source.
+
+Usage:
+    python benchmarks/bench_page_source.py path/to/textbook.pdf [--workers 8]
+"""
+
+import argparse
+import functools
+import os
+import sys
+import time
+
+import PyPDF2
+import pdfplumber
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.page_source import PDFPageSource, ParallelPageSource
+from app.pdf_processor import (
+    CHUNK_SIZE, EXTRACT_SHARD_SIZE, EXTRACT_WORKERS, HEADING_SCAN_PAGES, TOC_SCAN_PAGES
+)
+
+
+def legacy_extract(file_path):
+    """Reproduce the pre-streaming access pattern: count, TOC, headings, then per-chunk re-opens"""
+    with open(file_path, 'rb') as file:
+        total_pages = len(PyPDF2.PdfReader(file).pages)
+
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[:TOC_SCAN_PAGES]:
+            page.extract_text()
+
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[:HEADING_SCAN_PAGES]:
+            page.extract_text()
+
+    pages = 0
+    for start_page in range(0, total_pages, CHUNK_SIZE):
+        with pdfplumber.open(file_path) as pdf:
+            for page_num in range(start_page, min(start_page + CHUNK_SIZE, total_pages)):
+                pdf.pages[page_num].extract_text()
+                pages += 1
+    return pages
+
+
+def streaming_extract(file_path):
+    """Single open, single pass over every page"""
+    with PDFPageSource(file_path) as source:
+        total_pages = source.total_pages
+        for _ in source.iter_pages():
+            pass
+    return total_pages
+
+
+def parallel_extract(file_path, workers, shard_size):
+    """Shard the same single pass across a process pool"""
+    with ParallelPageSource(file_path, workers, shard_size) as source:
+        total_pages = source.total_pages
+        for _ in source.iter_pages():
+            pass
+    return total_pages
+
+
+def run(label, func, file_path, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages = func(file_path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<10} {pages:>6} pages  {best:8.2f}s  {pages / best:8.1f} pages/sec")
+    return pages / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf", help="PDF file to extract")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode; the best is reported")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="process pool size")
+    parser.add_argument("--shard-size", type=int, default=EXTRACT_SHARD_SIZE, help="pages per shard")
+    args = parser.parse_args()
+
+    before = run("legacy", legacy_extract, args.pdf, args.repeat)
+    after = run("streaming", streaming_extract, args.pdf, args.repeat)
+    print(f"speedup    {after / before:.2f}x")
+
+    if args.workers > 1:
+        parallel = functools.partial(
+            parallel_extract, workers=args.workers, shard_size=args.shard_size
+        )
+        pooled = run("parallel", parallel, args.pdf, args.repeat)
+        print(f"speedup    {pooled / before:.2f}x ({args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Run the full extraction pipeline over synthetic textbooks and report per-stage
+timings, throughput and peak memory as JSON for comparison across commits.
+
+Each size runs in a fresh process against a temporary SQLite database, so peak
+RSS is per run. Stages are timed separately (open, TOC, text extraction,
+question scan, DB write), then PDFProcessor.process_pdf is timed end to end.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--pages 50 300 1000] [--output results.json]
+                                        [--baseline previous.json] [--outline]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic_pdf import make_textbook
+
+
+def bench_size(pages, chapters, outline, workers, seed):
+    """Benchmark one synthetic textbook; runs in a child process"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.database import Base
+    from app.memory import current_rss_bytes, peak_rss_bytes
+    from app.models import Question, Textbook
+    from app.page_source import PDFPageSource
+    from app.pdf_processor import HEADING_SCAN_PAGES, PDFProcessor
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "textbook.pdf")
+        make_textbook(pdf_path, pages, chapters, outline, seed)
+
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+
+        stages = {}
+        stage_rss = {}
+
+        def timed(name, func):
+            started = time.perf_counter()
+            result = func()
+            stages[name] = time.perf_counter() - started
+            stage_rss[name] = current_rss_bytes()
+            return result
+
+        # Individual stages, in pipeline order
+        textbook = Textbook(filename="stages.pdf", original_name="stages.pdf", title="stages")
+        db.add(textbook)
+        db.commit()
+        processor = PDFProcessor(db, workers=1)
+        extractor = processor.question_extractor
+
+        source = PDFPageSource(pdf_path)
+        total_pages = timed("open", lambda: source.total_pages)
+        page_texts = timed("text_extraction", lambda: list(source.iter_pages()))
+        source.close()
+
+        def build_chapters():
+            entries = processor._extract_outline(pdf_path) or processor._extract_table_of_contents(
+                page_texts[:HEADING_SCAN_PAGES]
+            )
+            processor._store_chapters(entries, textbook.id, total_pages)
+            return entries
+
+        chapters_found = timed("toc", build_chapters)
+        rows = timed("question_scan", lambda: list(extractor.question_rows(page_texts, textbook.id)))
+
+        def write_rows():
+            for row in rows:
+                extractor.writer.add(row)
+            extractor.writer.flush()
+            db.commit()
+
+        timed("db_write", write_rows)
+
+        # The whole pipeline as the upload handler runs it
+        textbook = Textbook(filename="pipeline.pdf", original_name="pipeline.pdf", title="pipeline")
+        db.add(textbook)
+        db.commit()
+        started = time.perf_counter()
+        ok = PDFProcessor(db, workers=workers).process_pdf(pdf_path, textbook.id)
+        pipeline_seconds = time.perf_counter() - started
+        questions = db.query(Question).filter(Question.textbook_id == textbook.id).count()
+        db.close()
+
+        return {
+            "pages": pages,
+            "chapters": len(chapters_found),
+            "outline": outline,
+            "workers": workers,
+            "file_bytes": os.path.getsize(pdf_path),
+            "ok": ok,
+            "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+            "stage_rss_bytes": stage_rss,
+            "pipeline_seconds": round(pipeline_seconds, 4),
+            "pages_per_sec": round(pages / pipeline_seconds, 2),
+            "questions": questions,
+            "questions_per_sec": round(questions / pipeline_seconds, 2),
+            "peak_rss_bytes": peak_rss_bytes()
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result, baseline=None):
+    stages = "  ".join(f"{name} {seconds:.2f}s" for name, seconds in result["stages"].items())
+    print(f"{result['pages']:>6} pages  {result['pipeline_seconds']:8.2f}s  "
+          f"{result['pages_per_sec']:8.1f} pages/sec  {result['questions_per_sec']:8.1f} questions/sec  "
+          f"peak {result['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+    print(f"{'':>6}        {stages}")
+    if baseline:
+        print(f"{'':>6}        {result['pages_per_sec'] / baseline['pages_per_sec']:.2f}x pages/sec vs baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 300])
+    parser.add_argument("--chapters", type=int, default=12)
+    parser.add_argument("--outline", action="store_true", help="give the PDFs bookmarks instead of relying on the TOC page")
+    parser.add_argument("--workers", type=int, default=1, help="extraction workers for the end-to-end run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = {result["pages"]: result for result in json.load(file)["results"]}
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for pages in args.pages:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(bench_size, pages, args.chapters, args.outline, args.workers, args.seed).result()
+        print_result(result, baseline.get(pages))
+        results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare question insert throughput of the per-object ORM path against the
+bulk QuestionWriter path at several batch sizes.
+
+Usage:
+    python benchmarks/bench_question_insert.py [--rows 20000] [--batch-sizes 100 500 2000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import Base
+from app.models import Question
+from app.pdf_processor import CHUNK_SIZE
+from app.question_writer import QuestionWriter
+
+QUESTIONS_PER_PAGE = 5
+
+
+def make_rows(count):
+    return [{
+        'textbook_id': 1,
+        'chapter_id': 1 + index // 200,
+        'question_text': f"{index}. What is the main idea described in section {index}?",
+        'question_type': 'short_answer',
+        'page_number': 1 + index // QUESTIONS_PER_PAGE,
+        'context': "Surrounding paragraph text for context. " * 8,
+        'answer': None
+    } for index in range(count)]
+
+
+def make_session(directory, name):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def orm_insert(db, rows, batch_size):
+    """Previous path: one Question object and db.add per row, one commit per page chunk"""
+    rows_per_chunk = CHUNK_SIZE * QUESTIONS_PER_PAGE
+    for start in range(0, len(rows), rows_per_chunk):
+        for row in rows[start:start + rows_per_chunk]:
+            db.add(Question(**row))
+        db.commit()
+
+
+def bulk_insert(db, rows, batch_size):
+    """Bulk path: buffered dicts, executemany per batch, one commit per batch"""
+    writer = QuestionWriter(db, batch_size)
+    for row in rows:
+        writer.add(row)
+        if writer.pending >= batch_size:
+            writer.flush()
+            db.commit()
+    writer.flush()
+    db.commit()
+
+
+def run(label, func, rows, batch_size, directory):
+    db = make_session(directory, f"{label}.db")
+    started = time.perf_counter()
+    func(db, rows, batch_size)
+    elapsed = time.perf_counter() - started
+    assert db.query(Question).count() == len(rows)
+    db.close()
+    print(f"{label:<14} {len(rows):>7} rows  {elapsed:8.2f}s  {len(rows) / elapsed:10.0f} rows/sec")
+    return len(rows) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="questions to insert per run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = run("orm", orm_insert, rows, None, directory)
+        for batch_size in args.batch_sizes:
+            rate = run(f"bulk-{batch_size}", bulk_insert, rows, batch_size, directory)
+            print(f"{'':<14} {rate / baseline:.2f}x vs orm")
+
+
+if __name__ == "__main__":
+    main()
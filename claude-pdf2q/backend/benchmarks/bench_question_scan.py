@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of question scanning on a synthetic page corpus: the
+previous six-pass scanner against the compiled single-pass scanner.
+
+Usage:
+    python benchmarks/bench_question_scan.py [--pages 2000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.question_extractor import QuestionExtractor
+
+WORDS = (
+    "energy cell membrane process system function structure reaction rate "
+    "model theory data result change force mass volume pressure value"
+).split()
+
+
+def make_page(rnd):
+    """A page of prose with scattered questions, and sometimes an exercise block"""
+    lines = [f"Chapter {rnd.randint(1, 20)} section heading"]
+    for _ in range(rnd.randint(25, 40)):
+        lines.append(" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(8, 14))) + ".")
+        roll = rnd.random()
+        if roll < 0.05:
+            lines.append(f"{rnd.randint(1, 30)}. What is the {rnd.choice(WORDS)} of the {rnd.choice(WORDS)}?")
+        elif roll < 0.08:
+            lines.append(f"Why does the {rnd.choice(WORDS)} depend on {rnd.choice(WORDS)}?")
+        elif roll < 0.10:
+            lines.append(f"Q{rnd.randint(1, 9)}: How would you explain the {rnd.choice(WORDS)}?")
+    if rnd.random() < 0.2:
+        lines.append("Review Questions")
+        for number in range(1, rnd.randint(4, 10)):
+            lines.append(f"{number}. Describe how the {rnd.choice(WORDS)} affects the")
+            lines.append(f"{rnd.choice(WORDS)} in this {rnd.choice(WORDS)}?")
+    return "\n".join(lines)
+
+
+class LegacyScanner(QuestionExtractor):
+    """The scanner as it was before patterns and keyword lists were precompiled"""
+
+    question_patterns = [
+        r'\b\d+\.\s+(.+?\?)',
+        r'\b\d+\)\s+(.+?\?)',
+        r'^Q\d*[:\.]?\s+(.+?\?)',
+        r'^Question\s+\d*[:\.]?\s+(.+?\?)',
+        r'^\d+\.\d+\s+(.+?\?)',
+        r'^[A-Z][^.!?]*\?$',
+    ]
+    exercise_section_patterns = [
+        r'(?i)exercises?', r'(?i)problems?', r'(?i)review\s+questions?',
+        r'(?i)practice\s+problems?', r'(?i)homework', r'(?i)assignments?',
+        r'(?i)study\s+questions?', r'(?i)discussion\s+questions?',
+    ]
+
+    def _extract_questions_from_page(self, text, page_num):
+        lines = text.split('\n')
+        if self._is_exercise_section(text):
+            questions = self._extract_from_exercise_section(text, lines)
+        else:
+            questions = self._extract_scattered_questions(text, lines)
+        for question in questions:
+            question['context'] = self._get_question_context(question['text'], text)
+            question['type'] = self._classify_question_type(question['text'])
+        return questions
+
+    def _is_exercise_section(self, text):
+        text_lower = text.lower()
+        for pattern in self.exercise_section_patterns:
+            if re.search(pattern, text_lower):
+                return True
+        question_count = text.count('?')
+        return question_count >= 3 and question_count / len(text.split()) > 0.05
+
+    def _extract_from_exercise_section(self, text, lines):
+        questions = []
+        current_question = ""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            match = re.match(r'^(\d+)[\.\)]\s+(.*)', line)
+            if match:
+                if current_question and '?' in current_question:
+                    questions.append({'text': current_question.strip(), 'number': None})
+                current_question = match.group(2)
+            elif current_question:
+                current_question += " " + line
+        if current_question and '?' in current_question:
+            questions.append({'text': current_question.strip(), 'number': None})
+        return questions
+
+    def _extract_scattered_questions(self, text, lines):
+        questions = []
+        for pattern in self.question_patterns:
+            for match in re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE):
+                question_text = (match.group(1) if match.groups() else match.group(0)).strip()
+                if self._is_valid_question(question_text):
+                    questions.append({'text': question_text, 'number': None})
+        seen, unique = set(), []
+        for question in questions:
+            key = question['text'][:50].lower()
+            if key not in seen:
+                seen.add(key)
+                unique.append(question)
+        return unique
+
+    def _is_valid_question(self, text):
+        if not text or len(text) < 10 or not text.endswith('?'):
+            return False
+        text_lower = text.lower()
+        educational_keywords = [
+            'chapter', 'section', 'exercise', 'problem', 'question',
+            'review', 'practice', 'homework', 'assignment', 'study',
+            'discuss', 'explain', 'describe', 'analyze', 'compare'
+        ]
+        question_words = ['what', 'how', 'why', 'when', 'where', 'which', 'who', 'does', 'is', 'are', 'can', 'will', 'would', 'should']
+        has_educational_keyword = any(keyword in text_lower for keyword in educational_keywords)
+        starts_with_question_word = any(text_lower.startswith(word) for word in question_words)
+        return has_educational_keyword or starts_with_question_word
+
+    def _classify_question_type(self, question_text):
+        text_lower = question_text.lower()
+        if any(indicator in text_lower for indicator in ['a)', 'b)', 'c)', 'd)', 'choose', 'select']):
+            return 'multiple_choice'
+        if any(indicator in text_lower for indicator in ['true or false', 't/f', 'true/false']):
+            return 'true_false'
+        if any(indicator in text_lower for indicator in ['explain', 'describe', 'discuss', 'analyze', 'compare', 'contrast']):
+            return 'essay'
+        return 'short_answer'
+
+    def _get_question_context(self, question_text, full_text):
+        index = full_text.find(question_text)
+        if index == -1:
+            return ""
+        return full_text[max(0, index - 200):index + len(question_text) + 200].strip()
+
+
+def run(label, extractor, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = sum(len(extractor._extract_questions_from_page(page, 1)) for page in pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<12} {len(pages):>6} pages  {found:>6} questions  {best:7.3f}s  {len(pages) / best:9.0f} pages/sec")
+    return len(pages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000, help="synthetic pages to scan")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scanner; the best is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    pages = [make_page(rnd) for _ in range(args.pages)]
+
+    before = run("six-pass", LegacyScanner(None), pages, args.repeat)
+    after = run("single-pass", QuestionExtractor(None), pages, args.repeat)
+    print(f"speedup      {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Fire concurrent requests at a running API server and report latency
+percentiles per endpoint, to see how read endpoints hold up under load.
+
+Requests are spread over a mix of endpoints (random question, chapter list,
+chapter page, search, statistics) for one textbook. The client only uses the
+standard library: each connection is a keep-alive HTTP/1.1 stream on asyncio.
+
+Usage:
+    python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--textbook-id 1]
+                                   [--concurrency 50] [--requests 2000]
+                                   [--output results.json] [--baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection issuing GET requests in turn"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "connection" and value.strip().lower() == "close":
+                close = True
+        body = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def discover(connection, textbook_id):
+    """Chapter ids of the textbook, so chapter requests hit real rows"""
+    status, body = await connection.get(f"/api/chapters/{textbook_id}")
+    if status != 200:
+        raise SystemExit(f"Textbook {textbook_id} not found ({status}); upload and process one first")
+    return [chapter["id"] for chapter in json.loads(body)] or [0]
+
+
+def make_paths(textbook_id, chapter_ids, count, seed):
+    rnd = random.Random(seed)
+    endpoints = [
+        ("random", 5, lambda: f"/api/questions/random?textbook_id={textbook_id}"),
+        ("chapters", 2, lambda: f"/api/chapters/{textbook_id}"),
+        ("by_chapter", 2, lambda: f"/api/questions/by-chapter/{rnd.choice(chapter_ids)}?limit=10"),
+        ("search", 1, lambda: f"/api/questions/search?query=the&textbook_id={textbook_id}"),
+        ("statistics", 1, lambda: f"/api/statistics/{textbook_id}"),
+    ]
+    names = [name for name, _, _ in endpoints]
+    weights = [weight for _, weight, _ in endpoints]
+    builders = {name: build for name, _, build in endpoints}
+    return [(name, builders[name]()) for name in rnd.choices(names, weights, k=count)]
+
+
+async def run_load(url, textbook_id, concurrency, total, seed):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    chapter_ids = await discover(Connection(host, port), textbook_id)
+    work = make_paths(textbook_id, chapter_ids, total, seed)
+    latencies = {}
+    errors = {}
+    position = 0
+
+    async def client():
+        nonlocal position
+        connection = Connection(host, port)
+        while position < len(work):
+            name, path = work[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.get(path)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                connection.close()
+                status = None
+            elapsed = time.perf_counter() - started
+            latencies.setdefault(name, []).append(elapsed)
+            if status not in (200, 404):
+                errors[name] = errors.get(name, 0) + 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    endpoints = {
+        name: summarize(values, errors.get(name, 0)) for name, values in sorted(latencies.items())
+    }
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_sec": round(total / wall_seconds, 1),
+        "overall": summarize(all_latencies, sum(errors.values())),
+        "endpoints": endpoints
+    }
+
+
+def summarize(values, errors):
+    return {
+        "count": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2)
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"{report['requests']} requests, concurrency {report['concurrency']}: "
+          f"{report['requests_per_sec']} req/s in {report['wall_seconds']}s")
+    rows = [("overall", report["overall"])] + list(report["endpoints"].items())
+    print(f"{'endpoint':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>6}")
+    for name, stats in rows:
+        line = (f"{name:<12} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['errors']:>6}")
+        previous = (baseline or {}).get("overall" if name == "overall" else "endpoints", {})
+        previous = previous if name == "overall" else previous.get(name)
+        if previous:
+            line += f"   p99 {previous['p99_ms']:.1f} -> {stats['p99_ms']:.1f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--textbook-id", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    report = asyncio.run(run_load(args.url, args.textbook_id, args.concurrency, args.requests, args.seed))
+    report["timestamp"] = datetime.utcnow().isoformat()
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
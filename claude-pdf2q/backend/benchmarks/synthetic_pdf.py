@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic textbook PDFs for benchmarks, offline and without any
+PDF library: a table of contents, chapter headings, body text, end-of-chapter
+exercise sections and questions scattered through the prose.
+
+Usage:
+    python benchmarks/synthetic_pdf.py out.pdf [--pages 300] [--chapters 12] [--outline] [--seed 1]
+"""
+
+import argparse
+import random
+
+LINES_PER_PAGE = 48
+LINE_HEIGHT = 15
+TOC_PAGES = 2  # Title page plus one table of contents page
+
+SUBJECTS = [
+    "cell", "membrane", "enzyme", "protein", "energy", "ecosystem", "population",
+    "gene", "mutation", "tissue", "organ", "nutrient", "hormone", "neuron",
+    "photosynthesis", "respiration", "equilibrium", "reaction", "molecule", "force",
+    "velocity", "current", "circuit", "market", "supply", "demand", "policy", "treaty"
+]
+VERBS = [
+    "regulates", "transforms", "depends on", "limits", "increases", "reduces",
+    "connects to", "balances", "drives", "stores", "releases", "controls"
+]
+ADJECTIVES = [
+    "stable", "complex", "primary", "secondary", "local", "global", "rapid",
+    "gradual", "internal", "external", "measurable", "dominant"
+]
+QUESTION_TEMPLATES = [
+    "What is the role of the {a} {s} in the {t} described in section {n}?",
+    "How does the {s} affect the {t} when conditions become {a}?",
+    "Why is the {a} {s} important for understanding the {t}?",
+    "Explain how the {s} {v} the {t} in example {n}?",
+    "Describe the relationship between the {s} and the {a} {t}?",
+    "Compare the {a} {s} with the {t} discussed in figure {n}?",
+    "Which factor best explains why the {s} {v} the {t}?",
+    "True or false: the {a} {s} always {v} the {t}?",
+    "Choose the statement that describes how the {s} {v} the {t}?",
+]
+EXERCISE_HEADINGS = ["Exercises", "Review Questions", "Practice Problems", "Study Questions"]
+
+
+def make_question(rnd):
+    return rnd.choice(QUESTION_TEMPLATES).format(
+        a=rnd.choice(ADJECTIVES), s=rnd.choice(SUBJECTS), t=rnd.choice(SUBJECTS),
+        v=rnd.choice(VERBS), n=rnd.randint(1, 40)
+    )
+
+
+def make_sentence(rnd):
+    return (f"The {rnd.choice(ADJECTIVES)} {rnd.choice(SUBJECTS)} {rnd.choice(VERBS)} "
+            f"the {rnd.choice(SUBJECTS)} in most {rnd.choice(ADJECTIVES)} systems.")
+
+
+def chapter_starts(pages, chapters):
+    """First page of each chapter, spread evenly after the front matter"""
+    chapters = max(1, min(chapters, pages - TOC_PAGES))
+    span = (pages - TOC_PAGES) / chapters
+    return [TOC_PAGES + 1 + int(index * span) for index in range(chapters)]
+
+
+def make_pages(pages, chapters, seed=1, scattered_rate=0.3):
+    """
+    Lines of text for every page. Returns (pages, toc) where toc lists
+    (chapter number, title, first page) for each chapter.
+    """
+    rnd = random.Random(seed)
+    starts = chapter_starts(pages, chapters)
+    titles = [f"{rnd.choice(ADJECTIVES).title()} {rnd.choice(SUBJECTS).title()} Systems" for _ in starts]
+    toc = [(number, title, start) for number, (title, start) in enumerate(zip(titles, starts), 1)]
+    exercise_pages = {start - 1 for start in starts[1:]} | {pages}
+
+    page_lines = [
+        ["Synthetic Textbook", f"Edition {seed}"],
+        ["Table of Contents"] + [f"Chapter {number} {title}........{start}" for number, title, start in toc]
+    ]
+
+    chapter = 0
+    for page_number in range(TOC_PAGES + 1, pages + 1):
+        if chapter < len(starts) and page_number == starts[chapter]:
+            chapter += 1
+            lines = [f"Chapter {chapter}", titles[chapter - 1]]
+        else:
+            lines = [f"{titles[chapter - 1]} | {page_number}"]
+
+        body_lines = LINES_PER_PAGE - len(lines)
+        if page_number in exercise_pages:
+            body_lines //= 3
+        for _ in range(body_lines):
+            if rnd.random() < scattered_rate / 10:
+                lines.append(make_question(rnd))
+            else:
+                lines.append(make_sentence(rnd))
+
+        if page_number in exercise_pages:
+            lines.append(rnd.choice(EXERCISE_HEADINGS))
+            for number in range(1, rnd.randint(8, 20)):
+                lines.append(f"{number}. {make_question(rnd)}")
+
+        page_lines.append(lines)
+
+    return page_lines, toc
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, page_lines, outline=None):
+    """
+    Serialise pages of text lines as a minimal PDF 1.4 file with one
+    Helvetica text stream per page and an optional one-level outline
+    """
+    objects = {
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+    page_ids = []
+    next_id = 4
+
+    for lines in page_lines:
+        stream = f"BT /F1 10 Tf {LINE_HEIGHT} TL 40 770 Td " + " ".join(
+            f"({_escape(line)}) Tj T*" for line in lines
+        ) + " ET"
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        page_ids.append(page_id)
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    catalog = "<< /Type /Catalog /Pages 2 0 R"
+    if outline:
+        root_id = next_id
+        item_ids = list(range(root_id + 1, root_id + 1 + len(outline)))
+        for index, (title, page_number) in enumerate(outline):
+            item = (f"<< /Title ({_escape(title)}) /Parent {root_id} 0 R "
+                    f"/Dest [{page_ids[page_number - 1]} 0 R /Fit]")
+            if index > 0:
+                item += f" /Prev {item_ids[index - 1]} 0 R"
+            if index < len(outline) - 1:
+                item += f" /Next {item_ids[index + 1]} 0 R"
+            objects[item_ids[index]] = item + " >>"
+        objects[root_id] = (f"<< /Type /Outlines /First {item_ids[0]} 0 R "
+                            f"/Last {item_ids[-1]} 0 R /Count {len(outline)} >>")
+        catalog += f" /Outlines {root_id} 0 R"
+    objects[1] = catalog + " >>"
+    objects[2] = (f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] "
+                  f"/Count {len(page_ids)} >>")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode("latin-1")
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for object_id in sorted(objects):
+        output += f"{offsets[object_id]:010d} 00000 n \n".encode()
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+               f"startxref\n{xref_offset}\n%%EOF\n").encode()
+
+    with open(path, "wb") as file:
+        file.write(output)
+
+
+def make_textbook(path, pages=300, chapters=12, outline=False, seed=1):
+    """
+    Write a synthetic textbook PDF and return its table of contents
+    """
+    page_lines, toc = make_pages(pages, chapters, seed)
+    write_pdf(path, page_lines, [(f"Chapter {number}: {title}", start) for number, title, start in toc] if outline else None)
+    return toc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="PDF file to write")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--chapters", type=int, default=12)
+    parser.add_argument("--outline", action="store_true", help="add PDF bookmarks for each chapter")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    toc = make_textbook(args.path, args.pages, args.chapters, args.outline, args.seed)
+    print(f"Wrote {args.pages} pages, {len(toc)} chapters to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
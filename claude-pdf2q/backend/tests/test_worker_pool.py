@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+
+def wait_for(condition, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail(f"Timed out after {timeout:g}s waiting for {condition.__name__}")
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    # The database path is relative, so each test gets its own
+    monkeypatch.chdir(tmp_path)
+    from app.database import create_tables
+    from app.job_queue import WorkerPool
+
+    create_tables()
+    pool = WorkerPool(workers=2)
+    pool.start()
+    yield pool
+    pool.stop(timeout=1.0)
+
+
+def test_stop_after_worker_crash(pool):
+    # Kill a worker once it is idle, polling for jobs
+    wait_for(pool.is_ready)
+    crashed = pool.processes[0]
+    crashed.kill()
+    crashed.join(10)
+    assert not crashed.is_alive()
+
+    stopper = threading.Thread(target=pool.stop, kwargs={"timeout": 10.0}, daemon=True)
+    stopper.start()
+    stopper.join(30)
+
+    assert not stopper.is_alive(), "WorkerPool.stop() hung after a worker was killed"
+    assert pool.processes == []
@@ -35,6 +35,8 @@ const PracticePage = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [questionHistory, setQuestionHistory] = useState([]);
+  // Identifies this practice session so the server does not repeat questions
+  const [sessionId] = useState(() => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
 
   useEffect(() => {
     loadTextbooks();
@@ -85,6 +87,7 @@ const PracticePage = () => {
     try {
       const filters = {
         textbook_id: selectedTextbook,
+        session: sessionId,
         ...(selectedChapter && { chapter_id: selectedChapter })
       };
 
@@ -159,7 +162,7 @@ const PracticePage = () => {
               </MenuItem>
               {chapters.map((chapter) => (
                 <MenuItem key={chapter.id} value={chapter.id}>
-                  Chapter {chapter.chapter_number}: {chapter.title}
+                  Chapter {chapter.label || chapter.chapter_number}: {chapter.title}
                 </MenuItem>
               ))}
             </Select>
@@ -233,7 +236,7 @@ const PracticePage = () => {
                 />
                 {currentQuestion.chapter && (
                   <Chip
-                    label={`Ch. ${currentQuestion.chapter.chapter_number}: ${currentQuestion.chapter.title}`}
+                    label={`Ch. ${currentQuestion.chapter.label || currentQuestion.chapter.chapter_number}: ${currentQuestion.chapter.title}`}
                     size="small"
                     variant="outlined"
                   />
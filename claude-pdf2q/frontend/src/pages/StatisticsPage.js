@@ -247,7 +247,7 @@ const StatisticsPage = () => {
                   <TableRow key={chapter.id}>
                     <TableCell>
                       <Typography variant="body2">
-                        {chapter.chapter_number}
+                        {chapter.label || chapter.chapter_number}
                       </Typography>
                     </TableCell>
                     <TableCell>
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import {
   Box,
@@ -10,7 +10,8 @@ import {
   Step,
   StepLabel,
   StepContent,
-  CircularProgress
+  CircularProgress,
+  LinearProgress
 } from '@mui/material';
 import {
   ArrowBack,
@@ -44,33 +45,40 @@ const UploadPage = () => {
   const [textbookId, setTextbookId] = useState(null);
   const [processingStatus, setProcessingStatus] = useState(null);
   const [error, setError] = useState(null);
+  const closeStream = useRef(null);
   const navigate = useNavigate();
 
+  // Close the progress stream when leaving the page
+  useEffect(() => () => closeStream.current && closeStream.current(), []);
+
   const handleUploadComplete = async (result) => {
     setTextbookId(result.textbook_id);
     setActiveStep(1);
     
-    // Start polling for processing status
-    pollProcessingStatus(result.textbook_id);
+    // Follow processing progress as the server pushes it
+    watchProcessingStatus(result.textbook_id);
   };
 
-  const pollProcessingStatus = async (textbookId) => {
-    try {
-      const status = await uploadAPI.getProcessingStatus(textbookId);
-      setProcessingStatus(status);
-      
-      if (status.status === 'completed') {
-        setActiveStep(2);
-      } else if (status.status === 'failed') {
-        setError('Processing failed. Please try uploading again.');
-        setActiveStep(0);
-      } else if (status.status === 'processing') {
-        // Continue polling
-        setTimeout(() => pollProcessingStatus(textbookId), 3000);
-      }
-    } catch (err) {
-      setError('Failed to check processing status');
-    }
+  const watchProcessingStatus = (textbookId) => {
+    closeStream.current = uploadAPI.streamProcessingStatus(
+      textbookId,
+      async (progress) => {
+        setProcessingStatus((previous) => ({ ...previous, ...progress }));
+        
+        if (progress.status === 'completed') {
+          try {
+            setProcessingStatus(await uploadAPI.getProcessingStatus(textbookId));
+          } catch (err) {
+            // The progress snapshot is enough to continue
+          }
+          setActiveStep(2);
+        } else if (progress.status === 'failed' || progress.status === 'cancelled') {
+          setError(`Processing ${progress.status}. Please try uploading again.`);
+          setActiveStep(0);
+        }
+      },
+      () => setError('Failed to check processing status')
+    );
   };
 
   const handleStartPractice = () => {
@@ -78,6 +86,9 @@ const UploadPage = () => {
   };
 
   const handleReset = () => {
+    if (closeStream.current) {
+      closeStream.current();
+    }
     setActiveStep(0);
     setTextbookId(null);
     setProcessingStatus(null);
@@ -141,11 +152,28 @@ const UploadPage = () => {
                 )}
                 
                 {index === 1 && (
-                  <Box sx={{ display: 'flex', alignItems: 'center', gap: 2 }}>
-                    <CircularProgress size={24} />
-                    <Typography>
-                      Processing your textbook... This may take a few minutes.
-                    </Typography>
+                  <Box>
+                    <Box sx={{ display: 'flex', alignItems: 'center', gap: 2 }}>
+                      <CircularProgress size={24} />
+                      <Typography>
+                        Processing your textbook... This may take a few minutes.
+                      </Typography>
+                    </Box>
+                    
+                    {processingStatus && processingStatus.total_pages > 0 && (
+                      <Box sx={{ mt: 2 }}>
+                        <LinearProgress
+                          variant="determinate"
+                          value={100 * (processingStatus.pages_processed || 0) / processingStatus.total_pages}
+                        />
+                        <Typography variant="caption" color="textSecondary">
+                          {processingStatus.pages_processed || 0} of {processingStatus.total_pages} pages
+                          {' • '}{processingStatus.questions_found || 0} questions found
+                          {processingStatus.pages_per_sec && ` • ${processingStatus.pages_per_sec} pages/sec`}
+                          {processingStatus.eta_seconds != null && ` • about ${Math.ceil(processingStatus.eta_seconds)}s left`}
+                        </Typography>
+                      </Box>
+                    )}
                   </Box>
                 )}
                 
@@ -28,6 +28,27 @@ export const uploadAPI = {
     return response.data;
   },
 
+  // Subscribe to pushed progress updates; returns a function that closes the stream
+  streamProcessingStatus: (textbookId, onProgress, onError) => {
+    const source = new EventSource(`${API_BASE_URL}/api/processing-status/${textbookId}/stream`);
+    
+    source.addEventListener('progress', (event) => {
+      const progress = JSON.parse(event.data);
+      onProgress(progress);
+      if (['completed', 'failed', 'cancelled'].includes(progress.status)) {
+        source.close();
+      }
+    });
+    source.onerror = () => {
+      // EventSource reconnects by itself unless the server refused the stream
+      if (source.readyState === EventSource.CLOSED && onError) {
+        onError();
+      }
+    };
+    
+    return () => source.close();
+  },
+
   getTextbooks: async () => {
     const response = await api.get('/api/textbooks');
     return response.data;
@@ -46,11 +67,28 @@ export const questionsAPI = {
     if (filters.textbook_id) params.append('textbook_id', filters.textbook_id);
     if (filters.chapter_id) params.append('chapter_id', filters.chapter_id);
     if (filters.question_type) params.append('question_type', filters.question_type);
+    if (filters.session) params.append('session', filters.session);
     
     const response = await api.get(`/api/questions/random?${params}`);
     return response.data;
   },
 
+  getQuiz: async (count, filters = {}, options = {}) => {
+    const params = new URLSearchParams({ count });
+    
+    if (filters.textbook_id) params.append('textbook_id', filters.textbook_id);
+    if (filters.chapter_id) params.append('chapter_id', filters.chapter_id);
+    if (filters.question_type) params.append('question_type', filters.question_type);
+    if (options.stratify) params.append('stratify', options.stratify);
+    if (options.allocation) params.append('allocation', options.allocation);
+    if (options.chapter_weights) params.append('chapter_weights', options.chapter_weights);
+    if (options.type_weights) params.append('type_weights', options.type_weights);
+    if (options.seed !== undefined) params.append('seed', options.seed);
+    
+    const response = await api.get(`/api/questions/quiz?${params}`);
+    return response.data;
+  },
+
   getQuestionsByChapter: async (chapterId, limit = 10, offset = 0) => {
     const response = await api.get(
       `/api/questions/by-chapter/${chapterId}?limit=${limit}&offset=${offset}`
@@ -58,9 +96,12 @@ export const questionsAPI = {
     return response.data;
   },
 
-  searchQuestions: async (query, textbookId = null, limit = 10) => {
-    const params = new URLSearchParams({ query, limit });
-    if (textbookId) params.append('textbook_id', textbookId);
+  searchQuestions: async (query, filters = {}, limit = 10, offset = 0) => {
+    const params = new URLSearchParams({ query, limit, offset });
+    
+    if (filters.textbook_id) params.append('textbook_id', filters.textbook_id);
+    if (filters.chapter_id) params.append('chapter_id', filters.chapter_id);
+    if (filters.question_type) params.append('question_type', filters.question_type);
     
     const response = await api.get(`/api/questions/search?${params}`);
     return response.data;